@@ -136,9 +136,10 @@ class RequakeCatalog(list):
         """
         Deduplicate events in the catalog.
 
-        The operation is in place.
+        The first occurrence of each event is kept, and the order of the
+        events is preserved. The operation is in place.
         """
-        self[:] = list(set(self))
+        self[:] = list(dict.fromkeys(self))
 
     def sort(self):
         """
@@ -146,7 +147,10 @@ class RequakeCatalog(list):
 
         The operation is in place.
         """
-        self[:] = sorted(self, key=lambda ev: ev.orig_time)
+        # Sorting on integer nanoseconds is much faster than comparing
+        # UTCDateTime objects. Already sorted runs (e.g., a catalog read
+        # from file, followed by new events) are merged in linear time.
+        self[:] = sorted(self, key=lambda ev: ev.orig_time.ns)
 
     def read(self, filename):
         """
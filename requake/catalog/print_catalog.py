@@ -34,7 +34,8 @@ def print_catalog():
         ('mag\ntype', None),
         ('mag', '.1f')
     ]
-    rows = [
+    # rows are generated lazily, so that CSV output is streamed
+    rows = (
         [
             ev.evid,
             ev.orig_time,
@@ -45,5 +46,5 @@ def print_catalog():
             ev.mag
         ]
         for ev in catalog
-    ]
+    )
     generic_printer(rows, headers_fmt)
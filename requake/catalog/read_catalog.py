@@ -20,11 +20,33 @@ from .read_catalog_from_csv import read_catalog_from_csv
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
 
 
+def _is_fdsn_text(filename):
+    """
+    Check if a file looks like an FDSN text file, from its first event
+    line (i.e., the first non-empty line which is not a comment).
+
+    :param filename: input filename
+    :type filename: str
+
+    :return: True if the first event line has the FDSN text fields
+    :rtype: bool
+    """
+    try:
+        with open(filename, 'r', encoding='utf8') as fp:
+            first_line = next(
+                (line for line in fp if line.strip() and line[0] != '#'), '')
+    except UnicodeDecodeError:
+        return False
+    # FDSN text lines have 13 fields separated by "|"
+    return first_line.count('|') >= 12
+
+
 def _read_catalog_from_file():
     """
     Read an event catalog from a file.
 
-    Supported formats are QuakeML, FDSN text and CSV.
+    Supported formats are FDSN text, QuakeML (or any other event format
+    supported by ObsPy) and CSV.
 
     :return: Event catalog.
     :rtype: requake.catalog.RequakeCatalog
@@ -39,14 +61,17 @@ def _read_catalog_from_file():
     # return ValueError if the file is a directory
     if os.path.isdir(catalog_file):
         raise ValueError('Is a directory')
+    # FDSN text files are recognized from their first line and read
+    # directly: ObsPy would also read them, but much more slowly and
+    # dropping some of the fields
+    if _is_fdsn_text(catalog_file):
+        with contextlib.suppress(ValueError):
+            cat = RequakeCatalog()
+            cat.read(catalog_file)
+            return cat
     # try to read the catalog as a QuakeML file
     with contextlib.suppress(TypeError, IndexError, ValueError):
         return read_catalog_from_quakeml(catalog_file)
-    # try to read the catalog as a FDSN text file
-    with contextlib.suppress(ValueError):
-        cat = RequakeCatalog()
-        cat.read(catalog_file)
-        return cat
     # try to read the catalog as a CSV file
     # raises ValueError in case of failure
     return read_catalog_from_csv(catalog_file)
@@ -89,6 +114,29 @@ def _filter_catalog(catalog):
     return outcat
 
 
+def _merge_events(catalog, events, seen):
+    """
+    Append events to a catalog, skipping duplicate events.
+
+    :param catalog: Event catalog, modified in place.
+    :type catalog: requake.catalog.RequakeCatalog
+    :param events: Events to append.
+    :type events: iterable of requake.catalog.RequakeEvent
+    :param seen: Events already in the catalog, updated in place.
+    :type seen: set
+    :return: Number of duplicate events skipped.
+    :rtype: int
+    """
+    nevs_dup = 0
+    for ev in events:
+        if ev in seen:
+            nevs_dup += 1
+            continue
+        seen.add(ev)
+        catalog.append(ev)
+    return nevs_dup
+
+
 def read_catalog():
     """
     Read an event catalog from web services or from a file.
@@ -101,17 +149,19 @@ def read_catalog():
     catalog = RequakeCatalog()
     output_cat_file = config.scan_catalog_file
     nevs_read = 0
-    if config.args.append:
-        with contextlib.suppress(FileNotFoundError):
-            catalog = RequakeCatalog()
-            catalog.read(output_cat_file)
-            nevs_read = len(catalog)
-            logger.info(f'{nevs_read} events read from "{output_cat_file}"')
+    if config.args.append and os.path.exists(output_cat_file):
+        catalog.read(output_cat_file)
+        nevs_read = len(catalog)
+        logger.info(f'{nevs_read} events read from "{output_cat_file}"')
+    # duplicate events are skipped as they are read, based on their
+    # identity (evid and trace_id)
+    seen = set(catalog)
     logger.info('Reading catalog...')
     input_cat_file = config.args.catalog_file
     if input_cat_file is not None:
         try:
-            catalog += _read_catalog_from_file()
+            nevs_dedup = _merge_events(
+                catalog, _read_catalog_from_file(), seen)
             # Filter catalog based on configuration
             catalog = _filter_catalog(catalog)
         except FileNotFoundError:
@@ -123,15 +173,10 @@ def read_catalog():
             )
             rq_exit(1)
     else:
-        catalog += read_catalog_from_fdsnws()
+        nevs_dedup = _merge_events(catalog, read_catalog_from_fdsnws(), seen)
     if not catalog:
         logger.error('No event read')
         rq_exit(1)
-    # Deduplicate catalog
-    len_before = len(catalog)
-    catalog.deduplicate()
-    len_after = len(catalog)
-    nevs_dedup = len_before - len_after
     if nevs_dedup > 0:
         logger.info(f'{nevs_dedup} duplicate events removed')
     # Sort catalog in increasing time order
@@ -11,38 +11,65 @@ Read an event catalog from a CSV file.
 """
 import logging
 import csv
+import contextlib
+from datetime import datetime
 from obspy import UTCDateTime
+from tqdm import tqdm
 from ..formulas import float_or_none, int_or_none
 from .catalog import RequakeCatalog, RequakeEvent, generate_evid
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
 
 
+# Guesses for the field names, for each output field
+field_guesses = {
+    'evid': ['evid', 'event_id', 'eventid', 'event_id', 'id', 'evidid'],
+    'orig_time': [
+        'time', 'orig_time', 'origin_time', 'origin_time_utc',
+        'origin_time_iso'
+    ],
+    'year': ['year', 'yr', 'yyyy'],
+    'month': ['month', 'mon', 'mo', 'mm'],
+    'day': ['day', 'dy', 'dd'],
+    'hour': ['hour', 'hr', 'h', 'hh'],
+    'minute': ['minute', 'min'],
+    'seconds': ['seconds', 'second', 'sec', 's', 'ss'],
+    'lat': ['lat', 'latitude'],
+    'lon': ['lon', 'longitude'],
+    'depth': ['depth', 'depth_km'],
+    'mag': ['mag', 'magnitude'],
+    'mag_type': ['mag_type', 'magnitude_type']
+}
+# Add guesses with spaces instead of underscores, remove duplicates and
+# sort each list by decreasing length, so that the first guess matching
+# a field name is also the longest one
+field_guesses = {
+    field_name: tuple(sorted(
+        set(guesses) | {guess.replace('_', ' ') for guess in guesses},
+        key=lambda guess: (-len(guess), guess)
+    ))
+    for field_name, guesses in field_guesses.items()
+}
+
+
 def _field_match_score(field, field_list):
     """
     Return the length of the longest substring of field that matches any of
     the field names in field_list.
 
-    :param field: field name
+    :param field: field name, lowercase and without leading and trailing
+        spaces
     :type field: str
-    :param field_list: list of field names
-    :type field_list: list of str
+    :param field_list: field names, sorted by decreasing length
+    :type field_list: tuple of str
 
     :return: the length of the longest substring of field that matches any of
         the field names in field_list
     :rtype: int
     """
     # return a very high score for a perfect match
-    if field.lower().strip() in field_list:
+    if field in field_list:
         return 999
-    scores = [
-        len(guess)
-        for guess in field_list
-        if guess in field.lower().strip()
-    ]
-    try:
-        return max(scores)
-    except ValueError:
-        return 0
+    return next((len(guess) for guess in field_list if guess in field), 0)
 
 
 def _guess_field_names(input_fields):
@@ -57,27 +84,6 @@ def _guess_field_names(input_fields):
         longitude, depth, magnitude and magnitude type
     :rtype: dict
     """
-    field_guesses = {
-        'evid': ['evid', 'event_id', 'eventid', 'event_id', 'id', 'evidid'],
-        'orig_time': [
-            'time', 'orig_time', 'origin_time', 'origin_time_utc',
-            'origin_time_iso'
-        ],
-        'year': ['year', 'yr', 'yyyy'],
-        'month': ['month', 'mon', 'mo', 'mm'],
-        'day': ['day', 'dy', 'dd'],
-        'hour': ['hour', 'hr', 'h', 'hh'],
-        'minute': ['minute', 'min'],
-        'seconds': ['seconds', 'second', 'sec', 's', 'ss'],
-        'lat': ['lat', 'latitude'],
-        'lon': ['lon', 'longitude'],
-        'depth': ['depth', 'depth_km'],
-        'mag': ['mag', 'magnitude'],
-        'mag_type': ['mag_type', 'magnitude_type']
-    }
-    # update the above lists with spaces instead of underscores
-    for values in field_guesses.values():
-        values.extend([val.replace('_', ' ') for val in values])
     output_fields = {
         # A None key must be present in the output dictionary
         None: None,
@@ -97,8 +103,9 @@ def _guess_field_names(input_fields):
     }
     output_field_scores = {field: 0 for field in output_fields}
     for in_field in input_fields:
+        in_field_normalized = in_field.lower().strip()
         for field_name, guess_list in field_guesses.items():
-            score = _field_match_score(in_field, guess_list)
+            score = _field_match_score(in_field_normalized, guess_list)
             if score > output_field_scores[field_name]:
                 output_field_scores[field_name] = score
                 output_fields[field_name] = in_field
@@ -136,31 +143,58 @@ def _guess_field_names(input_fields):
     return output_fields
 
 
-def _csv_file_info(filename):
+def _parse_orig_time(orig_time_str):
+    """
+    Parse an origin time string.
+
+    ISO 8601 strings are parsed through datetime.fromisoformat(), which is
+    much faster than UTCDateTime string parsing. Other strings, as well as
+    strings with sub-microsecond digits, which datetime would truncate,
+    are parsed by UTCDateTime.
+
+    :param orig_time_str: origin time string
+    :type orig_time_str: str
+
+    :return: origin time
+    :rtype: obspy.UTCDateTime
+
+    :raises ValueError: if the string cannot be parsed
+    """
+    with contextlib.suppress(ValueError, TypeError, AttributeError):
+        fraction = orig_time_str.partition('.')[2]
+        if len(fraction) - len(fraction.lstrip('0123456789')) <= 6:
+            return UTCDateTime(datetime.fromisoformat(orig_time_str))
+    try:
+        return UTCDateTime(orig_time_str)
+    except ValueError:
+        # one last try: check if the time is in the format
+        # YYYYMMDD.hhmmss.
+        # Replace the dot with a space, pad with zeros
+        # and try again
+        return UTCDateTime(orig_time_str.replace('.', ' ').ljust(15, '0'))
+
+
+def _csv_delimiter(filename):
     """
-    Determine the delimiter and the number of rows in a CSV file.
+    Determine the delimiter of a CSV file, from its first lines.
 
     :param filename: input filename
     :type filename: str
 
-    :return: a tuple with the delimiter and the number of rows
-    :rtype: tuple
+    :return: the delimiter
+    :rtype: str
     """
+    n_first_lines = 5
     with open(filename, 'r', encoding='utf8') as fp:
-        nrows = sum(1 for _ in fp)
-        fp.seek(0)
-        n_first_lines = 5
         first_lines = ''.join(fp.readline() for _ in range(n_first_lines))
-        # count the number of commas and semicolons in the first n lines
-        ncommas = first_lines.count(',')
-        nsemicolons = first_lines.count(';')
-        if ncommas >= n_first_lines:
-            delimiter = ','
-        elif nsemicolons >= n_first_lines:
-            delimiter = ';'
-        else:
-            delimiter = ' '
-    return delimiter, nrows
+    # count the number of commas and semicolons in the first n lines
+    ncommas = first_lines.count(',')
+    nsemicolons = first_lines.count(';')
+    if ncommas >= n_first_lines:
+        return ','
+    if nsemicolons >= n_first_lines:
+        return ';'
+    return ' '
 
 
 def read_catalog_from_csv(filename):
@@ -176,14 +210,18 @@ def read_catalog_from_csv(filename):
     :raises FileNotFoundError: if filename does not exist
     :raises ValueError: if no origin time field is found
     """
-    delimiter, nrows = _csv_file_info(filename)
+    # the file is not scanned beforehand to count the rows: the progress
+    # bar reports the number of rows read so far
+    delimiter = _csv_delimiter(filename)
     with open(filename, 'r', encoding='utf8') as fp:
         reader = csv.DictReader(fp, delimiter=delimiter)
         fields = _guess_field_names(reader.fieldnames)
-        nrows -= 1  # first row is the header
-        cat = RequakeCatalog()
-        for n, row in enumerate(reader):
-            print(f'reading row {n+1}/{nrows}\r', end='')
+        events = []
+        events_append = events.append
+        # tqdm throttles its terminal updates, unlike a print() per row
+        for n, row in enumerate(
+                tqdm(reader, desc='Reading rows', unit='rows',
+                     unit_scale=True)):
             if fields['orig_time'] is None:
                 # try build a date-time field from year, month, day, hour,
                 # minute and seconds fields
@@ -199,21 +237,12 @@ def read_catalog_from_csv(filename):
             else:
                 orig_time_str = row[fields['orig_time']]
                 try:
-                    orig_time = UTCDateTime(orig_time_str)
+                    orig_time = _parse_orig_time(orig_time_str)
                 except ValueError:
-                    # one last try: check if the time is in the format
-                    # YYYYMMDD.hhmmss.
-                    # Replace the dot with a space, pad with zeros
-                    # and try again
-                    try:
-                        orig_time = UTCDateTime(
-                            orig_time_str.replace('.', ' ').ljust(15, '0')
-                        )
-                    except ValueError:
-                        logger.error(
-                            f'Unable to parse origin time at row {n+2}: '
-                            f'"{orig_time_str}"')
-                        continue
+                    logger.error(
+                        f'Unable to parse origin time at row {n+2}: '
+                        f'"{orig_time_str}"')
+                    continue
             row[None] = None
             ev = RequakeEvent()
             ev.orig_time = orig_time
@@ -225,6 +254,5 @@ def read_catalog_from_csv(filename):
             ev.depth = float_or_none(row[fields['depth']])
             ev.mag_type = row[fields['mag_type']]
             ev.mag = float_or_none(row[fields['mag']])
-            cat.append(ev)
-    print()  # needed to add a newline after the last "reading row" message
-    return cat
+            events_append(ev)
+    return RequakeCatalog(events)
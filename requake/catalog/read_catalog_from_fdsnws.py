@@ -9,14 +9,119 @@ Read an event catalog from FDNS web services.
     GNU General Public License v3.0 or later
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
+import os
+import gzip
+import time
+import hashlib
 import logging
+import tempfile
 import contextlib
-import urllib.request
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from obspy import UTCDateTime
 from obspy.clients.fdsn.header import URL_MAPPINGS
 from ..config import config
 from .catalog import RequakeCatalog, RequakeEvent
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
+# A single HTTP session for all the requests, so that connections to the
+# same server are kept alive and reused. Requests sent through the session
+# ask for gzip-compressed responses
+_session = requests.Session()
+
+
+def _events_from_fdsn_text(lines):
+    """
+    Parse events from lines in FDSN text format.
+
+    Comment lines and invalid lines are skipped.
+
+    :param lines: lines in FDSN text format
+    :type lines: iterable of str
+
+    :return: a RequakeCatalog object
+    :rtype: RequakeCatalog
+    """
+    events = []
+    events_append = events.append
+    for line in lines:
+        if not line.strip():
+            continue
+        if line[0] == '#':
+            continue
+        try:
+            ev = RequakeEvent()
+            ev.from_fdsn_text(line)
+        except ValueError:
+            continue
+        events_append(ev)
+    return RequakeCatalog(events)
+
+
+def _use_catalog_cache():
+    """Return True if FDSN event responses must be cached on disk."""
+    return config.catalog_cache_ttl > 0
+
+
+def _catalog_cache_file(url):
+    """Return the cache file name for an FDSN event query URL."""
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(config.catalog_cache_dir, f'{key}.txt.gz')
+
+
+def _read_catalog_cache(url):
+    """
+    Read the response to an FDSN event query from the disk cache.
+
+    :raises FileNotFoundError: if the response is not in the cache, or if
+        it is older than the cache TTL
+    """
+    if not _use_catalog_cache():
+        raise FileNotFoundError('Catalog cache disabled')
+    cache_file = _catalog_cache_file(url)
+    age = time.time() - os.path.getmtime(cache_file)
+    if age > config.catalog_cache_ttl * 3600:
+        raise FileNotFoundError(f'Expired cache file: {cache_file}')
+    with gzip.open(cache_file, 'rt', encoding='utf-8') as fp:
+        return _events_from_fdsn_text(fp)
+
+
+def _copy_lines(lines, fp):
+    """Yield lines, while writing them to a file object."""
+    for line in lines:
+        fp.write(f'{line}\n')
+        yield line
+
+
+def _write_catalog_cache(url, lines):
+    """
+    Parse the response to an FDSN event query, while writing it to the
+    disk cache.
+
+    :param url: FDSN event query URL
+    :type url: str
+    :param lines: lines of the response
+    :type lines: iterable of str
+
+    :return: a RequakeCatalog object
+    :rtype: RequakeCatalog
+    """
+    cache_file = _catalog_cache_file(url)
+    os.makedirs(config.catalog_cache_dir, exist_ok=True)
+    # write to a temporary file first, so that an interrupted download
+    # never leaves a partial response in the cache. The temporary file name
+    # is unique across threads and processes
+    fd, tmp_file = tempfile.mkstemp(
+        suffix='.tmp', dir=config.catalog_cache_dir)
+    os.close(fd)
+    try:
+        with gzip.open(tmp_file, 'wt', encoding='utf-8') as fp:
+            cat = _events_from_fdsn_text(_copy_lines(lines, fp))
+        os.replace(tmp_file, cache_file)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_file)
+    return cat
 
 
 def _get_events_from_fdsnws(
@@ -65,60 +170,76 @@ def _get_events_from_fdsnws(
     :return: a RequakeCatalog object
     :rtype: RequakeCatalog
 
-    :raises: urllib.error.HTTPError if the URL returns an HTTP error
+    Responses are cached on disk (see the "catalog_cache_ttl" config
+    parameter).
+
+    :raises: requests.HTTPError if the URL returns an HTTP error
     """
-    # pylint: disable=unused-argument
-    arguments = locals()
-    query = 'query?format=text&nodata=404&'
-    for key, val in arguments.items():
-        if key in ['baseurl']:
-            continue
-        if val is None:
-            continue
-        if isinstance(val, UTCDateTime):
-            val = val.strftime('%Y-%m-%dT%H:%M:%S')
-        query += f'{key}={val}&'
-    # remove last "&" symbol
-    query = query[:-1]
+    params = {
+        'format': 'text', 'nodata': 404,
+        'starttime': starttime, 'endtime': endtime,
+        'minlatitude': minlatitude, 'maxlatitude': maxlatitude,
+        'minlongitude': minlongitude, 'maxlongitude': maxlongitude,
+        'latitude': latitude, 'longitude': longitude,
+        'minradius': minradius, 'maxradius': maxradius,
+        'mindepth': mindepth, 'maxdepth': maxdepth,
+        'minmagnitude': minmagnitude, 'maxmagnitude': maxmagnitude,
+        'eventid': eventid
+    }
+    # urlencode() takes care of escaping the parameter values
+    query = 'query?' + urllib.parse.urlencode({
+        key: (
+            val.strftime('%Y-%m-%dT%H:%M:%S')
+            if isinstance(val, UTCDateTime) else val
+        )
+        for key, val in params.items()
+        if val is not None
+    })
     # see if baseurl is an alias defined in ObsPy
-    with contextlib.suppress(KeyError):
-        baseurl = URL_MAPPINGS[baseurl]
+    baseurl = URL_MAPPINGS.get(baseurl, baseurl)
     baseurl = f'{baseurl}/fdsnws/event/1/'
     url = baseurl + query
+    with contextlib.suppress(FileNotFoundError):
+        cat = _read_catalog_cache(url)
+        logger.info(f'Using cached response for {url}')
+        return cat
     logger.info(f'Requesting {url} ...')
-    cat = RequakeCatalog()
-    with urllib.request.urlopen(url) as f:
-        content = f.read().decode('utf-8')
-    for line in content.split('\n'):
-        if not line:
-            continue
-        if line[0] == '#':
-            continue
-        try:
-            ev = RequakeEvent()
-            ev.from_fdsn_text(line)
-        except ValueError:
-            continue
-        cat.append(ev)
-    return cat
+    # parse the response line by line, as it is received, instead of
+    # reading and decoding it as a whole.
+    # Large queries can take long to be served: the read timeout is long
+    # and applies to each chunk of the response, not to the whole response
+    with _session.get(url, stream=True, timeout=(30, 600)) as response:
+        response.raise_for_status()
+        # FDSN text is UTF-8, whatever the declared content type
+        response.encoding = 'utf-8'
+        # gzip-compressed responses are decompressed as they are received
+        lines = response.iter_lines(chunk_size=65536, decode_unicode=True)
+        if not _use_catalog_cache():
+            return _events_from_fdsn_text(lines)
+        return _write_catalog_cache(url, lines)
 
 
 def read_catalog_from_fdsnws():
     """
     Read an event catalog from FDSN web services.
 
+    Requests for the different URLs and periods are sent in parallel.
+
     :return: Event catalog.
     :rtype: requake.catalog.RequakeCatalog
     """
     logger.info('Downloading events from FDSN web services...')
-    cat_info = zip(
+    cat_info = list(zip(
         config.catalog_fdsn_event_urls,
         config.catalog_start_times,
-        config.catalog_end_times)
+        config.catalog_end_times))
     event_list = []
-    for url, start_time, end_time in cat_info:
-        try:
-            event_list += _get_events_from_fdsnws(
+    # no more parallel requests than the connections kept by the session
+    max_workers = min(len(cat_info), requests.adapters.DEFAULT_POOLSIZE)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [
+            executor.submit(
+                _get_events_from_fdsnws,
                 url,
                 starttime=start_time, endtime=end_time,
                 minlatitude=config.catalog_lat_min,
@@ -130,11 +251,18 @@ def read_catalog_from_fdsnws():
                 minmagnitude=config.catalog_mag_min,
                 maxmagnitude=config.catalog_mag_max
             )
-        except urllib.error.HTTPError as msg:
-            logger.warning(
-                f'Unable to download events from {url} for period '
-                f'{start_time} - {end_time}. {msg}'
-            )
+            for url, start_time, end_time in cat_info
+        ]
+        # results are collected in request order, so that the catalog
+        # (and its deduplication) does not depend on response times
+        for (url, start_time, end_time), future in zip(cat_info, futures):
+            try:
+                event_list += future.result()
+            except requests.HTTPError as msg:
+                logger.warning(
+                    f'Unable to download events from {url} for period '
+                    f'{start_time} - {end_time}. {msg}'
+                )
     catalog = RequakeCatalog(event_list)
     logger.info(f'{len(catalog)} events downloaded')
     return catalog
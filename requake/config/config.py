@@ -28,4 +28,14 @@ class Config(dict):
 
     __setattr__ = __setitem__
 
+    def update(self, *args, **kwargs):
+        """
+        Update Config keys, making them accessible as attributes.
+
+        dict.update() does not call __setitem__(): without this, updated
+        keys would only be reachable through the slower __getattr__().
+        """
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
 config = Config()  # noqa
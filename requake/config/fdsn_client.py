@@ -0,0 +1,95 @@
+# -*- coding: utf8 -*-
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+FDSN web service client with persistent HTTP connections.
+
+:copyright:
+    2021-2024 Claudio Satriano <satriano@ipgp.fr>
+:license:
+    GNU General Public License v3.0 or later
+    (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
+"""
+import io
+import inspect
+import requests
+from obspy.clients.fdsn import Client
+try:
+    from obspy.clients.fdsn.client import raise_on_error
+except ImportError:
+    raise_on_error = None
+
+
+def _download_api_supported():
+    """
+    Check that the ObsPy private API overridden by FDSNClient is available.
+
+    :return: True if Client._download() has the expected signature
+    :rtype: bool
+    """
+    if raise_on_error is None:
+        return False
+    download = getattr(Client, '_download', None)
+    if download is None:
+        return False
+    try:
+        params = list(inspect.signature(download).parameters)
+    except (TypeError, ValueError):
+        return False
+    return params == [
+        'self', 'url', 'return_string', 'data', 'use_gzip', 'content_type']
+
+
+class FDSNClient(Client):
+    """
+    An ObsPy FDSN client which keeps HTTP connections alive.
+
+    ObsPy opens a new connection (and performs a new TLS handshake) for
+    each request. Here, requests are sent through a requests.Session, so
+    that connections to the server are reused by the following requests.
+
+    Authenticated clients use the default ObsPy implementation.
+    The default ObsPy client is also used if the ObsPy private API
+    overridden here is not available (see the end of this module).
+    """
+
+    def __init__(self, *args, **kwargs):
+        # the session must exist before the parent constructor,
+        # which can already send requests
+        self._session = requests.Session()
+        super().__init__(*args, **kwargs)
+
+    def _download(self, url, return_string=False, data=None, use_gzip=None,
+                  content_type=None):
+        """
+        Download a URL and return its content.
+
+        Same interface as obspy.clients.fdsn.Client._download().
+        """
+        if self.user is not None:
+            return super()._download(
+                url, return_string=return_string, data=data,
+                use_gzip=use_gzip, content_type=content_type)
+        if use_gzip is None:
+            use_gzip = self.use_gzip
+        headers = self.request_headers.copy()
+        if content_type:
+            headers['Content-Type'] = content_type
+        # requests decompresses gzip responses transparently
+        headers['Accept-Encoding'] = 'gzip' if use_gzip else 'identity'
+        try:
+            response = self._session.request(
+                'GET' if data is None else 'POST', url, data=data,
+                headers=headers, timeout=self.timeout)
+        except requests.RequestException as err:
+            # raise the same exceptions as ObsPy for network errors
+            raise_on_error(None, err)
+        code = response.status_code
+        content = response.content
+        if code != 200:
+            raise_on_error(code, content)
+        return content if return_string else io.BytesIO(content)
+
+
+if not _download_api_supported():
+    # ObsPy private API has changed: fall back to the default client
+    FDSNClient = Client  # noqa: F811
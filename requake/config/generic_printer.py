@@ -17,14 +17,20 @@ import logging
 from tabulate import tabulate
 from .config import config
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
+# tabulate table formats for each output format
+tabulate_formats = {
+    'simple': 'simple',
+    'markdown': 'github'
+}
 
 
 def generic_printer(rows, headers_fmt, print_headers=True):
     """
     A generic printer function for Requake.
 
-    :param rows: Rows to print.
-    :type rows: list of rows
+    :param rows: Rows to print. CSV rows are written as they are
+        generated, so this can be a generator.
+    :type rows: iterable of rows
     :param headers_fmt: Headers and format strings.
     :type headers_fmt: list of tuples of str
     """
@@ -48,11 +54,7 @@ def generic_printer(rows, headers_fmt, print_headers=True):
             devnull = os.open(os.devnull, os.O_WRONLY)
             os.dup2(devnull, sys.stdout.fileno())
     else:
-        format_dict = {
-            'simple': 'simple',
-            'markdown': 'github'
-        }
-        tablefmt = format_dict[config.args.format]
+        tablefmt = tabulate_formats[config.args.format]
         with contextlib.suppress(BrokenPipeError):
             kwargs = {
                 'headers': headers,
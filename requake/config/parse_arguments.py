@@ -311,6 +311,12 @@ def parse_arguments(progname='requake'):
         '-T', '--template', action='store_true',
         help='plot family members found with template scan'
     )
+    plotfamilies.add_argument(
+        '-F', '--fast', action='store_true',
+        help='faster, lower quality trace drawing (no antialiasing and '
+             'stronger line simplification). Useful for long traces or '
+             'large families'
+    )
     # ---
     # --- plot_timespans
     plot_timespans = subparser.add_parser(
@@ -10,19 +10,22 @@ Setup functions for Requake.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 import contextlib
+import importlib
+import importlib.metadata
 import sys
 import os
 import shutil
 import logging
 import signal
+from concurrent.futures import ThreadPoolExecutor
 import tqdm
 from obspy import UTCDateTime
 from obspy import read_inventory
 from obspy.clients.filesystem.sds import Client as SDSClient
-from obspy.clients.fdsn import Client as FDSNClient
 from obspy.clients.fdsn.header import FDSNNoServiceException
 from .._version import get_versions
 from .config import config
+from .fdsn_client import FDSNClient
 from .utils import (
     parse_configspec, read_config, validate_config, write_sample_config,
     update_config_file, write_ok
@@ -36,18 +39,29 @@ SCIPY_VERSION_STR = None
 OBSPY_VERSION_STR = None
 
 
+def _library_version(name):
+    """
+    Return the version of an installed library.
+
+    The version is read from the package metadata, without importing
+    the library.
+    """
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        # not installed as a distribution (e.g., running from a source tree)
+        return importlib.import_module(name).__version__
+
+
 def _check_library_versions():
     global PYTHON_VERSION_STR
     PYTHON_VERSION_STR = '.'.join(map(str, sys.version_info[:3]))
-    import numpy
     global NUMPY_VERSION_STR
-    NUMPY_VERSION_STR = numpy.__version__
-    import scipy
+    NUMPY_VERSION_STR = _library_version('numpy')
     global SCIPY_VERSION_STR
-    SCIPY_VERSION_STR = scipy.__version__
-    import obspy
+    SCIPY_VERSION_STR = _library_version('scipy')
     global OBSPY_VERSION_STR
-    OBSPY_VERSION_STR = obspy.__version__
+    OBSPY_VERSION_STR = _library_version('obspy')
 
 
 def _make_outdir(outdir):
@@ -150,12 +164,38 @@ def _setup_logging(progname, action_name):
     logger.debug(' '.join(sys.argv))
 
 
+def _fdsn_clients(urls):
+    """
+    Connect to FDSN web services.
+
+    Clients are created in parallel, since each of them queries the
+    server for the available services.
+
+    :param urls: FDSN web service URLs
+    :type urls: list of str
+
+    :return: FDSN clients, in the same order as the URLs
+    :rtype: list of obspy.clients.fdsn.Client
+    """
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        return list(executor.map(FDSNClient, urls))
+
+
 def _connect_station_dataselect():
     """
     Connect to station and dataselect services.
 
     Those can be either FDSN web services or local files.
     """
+    fdsn_urls = {}
+    if config.station_metadata_path is None:
+        fdsn_urls['station'] = config.fdsn_station_url
+    if config.waveform_data_path is None:
+        fdsn_urls['dataselect'] = config.fdsn_dataselect_url
+    fdsn_clients = dict(
+        zip(fdsn_urls, _fdsn_clients(list(fdsn_urls.values()))))
     if config.station_metadata_path is not None:
         config.inventory = read_inventory(config.station_metadata_path)
         config.station_client = None
@@ -164,14 +204,14 @@ def _connect_station_dataselect():
             f'{config.station_metadata_path}'
         )
     else:
-        config.station_client = FDSNClient(config.fdsn_station_url)
+        config.station_client = fdsn_clients['station']
         logger.info(
             f'Connected to FDSN station server: {config.fdsn_station_url}'
         )
     if config.waveform_data_path is not None:
         _connect_sds()
     else:
-        config.dataselect_client = FDSNClient(config.fdsn_dataselect_url)
+        config.dataselect_client = fdsn_clients['dataselect']
         logger.info(
             'Connected to FDSN dataselect server: '
             f'{config.fdsn_dataselect_url}'
@@ -221,9 +261,9 @@ def _parse_catalog_options():
 
 def _connect_fdsn_catalog():
     """Connect to FDSN catalog services."""
-    config.catalog_fdsn_event_clients = []
+    config.catalog_fdsn_event_clients = _fdsn_clients(
+        config.catalog_fdsn_event_urls)
     for url in config.catalog_fdsn_event_urls:
-        config.catalog_fdsn_event_clients.append(FDSNClient(url))
         logger.info(f'Connected to FDSN event server: {url}')
 
 
@@ -265,6 +305,12 @@ def configure(args):
     config.template_dir = os.path.join(
         config.args.outdir, 'templates'
     )
+    config.waveform_cache_dir = os.path.join(
+        config.args.outdir, 'waveform_cache'
+    )
+    config.catalog_cache_dir = os.path.join(
+        config.args.outdir, 'catalog_cache'
+    )
     if (
         args.action == 'read_catalog' and
         not args.append and
@@ -13,6 +13,7 @@ import sys
 import logging
 import csv
 import os
+from functools import cached_property
 from glob import glob
 import numpy as np
 from obspy import UTCDateTime, Stream
@@ -21,7 +22,7 @@ from ..config import config
 from ..formulas import float_or_none, mag_to_slip_in_cm, mag_to_moment
 from ..catalog import RequakeEvent
 from ..waveforms import (
-    get_event_waveform, align_traces, build_template,
+    get_event_waveforms, align_traces, build_template,
     NoWaveformError
 )
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
@@ -89,6 +90,7 @@ class Family(list):
             raise ValueError('Event trace_id does not match family trace_id')
         super().append(ev)
         self.sort()
+        self._clear_cached_arrays()
         if ev.lon is not None:
             self.lon = np.mean([e.lon for e in self])
         if ev.lat is not None:
@@ -129,13 +131,91 @@ class Family(list):
         """
         Extend the family with a list of events.
 
-        Events already in the family are not added.
+        Events already in the family are not added. Family attributes are
+        updated once, after all the events have been added.
 
         :param ev_list: List of events to append.
         :type ev_list: list of RequakeEvent
         """
+        event_keys = {(ev.evid, ev.trace_id) for ev in self}
+        new_events = []
         for ev in ev_list:
-            self.append(ev)
+            if not isinstance(ev, RequakeEvent):
+                raise TypeError('Event must be a RequakeEvent')
+            if (ev.evid, ev.trace_id) in event_keys:
+                continue
+            if self.trace_id is None:
+                self.trace_id = ev.trace_id
+            elif ev.trace_id != self.trace_id:
+                raise ValueError(
+                    'Event trace_id does not match family trace_id')
+            event_keys.add((ev.evid, ev.trace_id))
+            new_events.append(ev)
+        if not new_events:
+            return
+        super().extend(new_events)
+        self.sort()
+        self._clear_cached_arrays()
+        self._update_attributes()
+
+    def _clear_cached_arrays(self):
+        """
+        Clear the cached event arrays, after the family has changed.
+        """
+        self.__dict__.pop('matplotlib_dates', None)
+        self.__dict__.pop('magnitudes', None)
+
+    @cached_property
+    def matplotlib_dates(self):
+        """
+        Event origin times, as Matplotlib dates.
+
+        :return: Array of origin times.
+        :rtype: numpy.ndarray
+        """
+        return np.fromiter(
+            (ev.orig_time.matplotlib_date for ev in self),
+            dtype=float, count=len(self))
+
+    @cached_property
+    def magnitudes(self):
+        """
+        Event magnitudes, NaN for events without magnitude.
+
+        :return: Array of magnitudes.
+        :rtype: numpy.ndarray
+        """
+        # missing magnitudes (None) are converted to NaN
+        return np.array([ev.mag for ev in self], dtype=float)
+
+    def _update_attributes(self):
+        """
+        Compute family attributes from all the events in the family.
+        """
+        lons = [ev.lon for ev in self if ev.lon is not None]
+        if lons:
+            self.lon = np.mean(lons)
+        lats = [ev.lat for ev in self if ev.lat is not None]
+        if lats:
+            self.lat = np.mean(lats)
+        depths = [ev.depth for ev in self if ev.depth is not None]
+        if depths:
+            self.depth = np.mean(depths)
+        # events are sorted by origin time
+        self.starttime = self[0].orig_time
+        self.endtime = self[-1].orig_time
+        year = 365*24*60*60
+        self.duration = (self.endtime - self.starttime)/year
+        mags = self.magnitudes[~np.isnan(self.magnitudes)]
+        if not mags.size:
+            return
+        self.magmin = mags.min()
+        self.magmax = mags.max()
+        self.cumul_slip = mag_to_slip_in_cm(mags).sum()
+        ev_first_slip = mag_to_slip_in_cm(self[0].mag)
+        d_slip = self.cumul_slip - ev_first_slip
+        self.slip_rate = np.inf if self.duration == 0 else d_slip/self.duration
+        self.cumul_moment = mag_to_moment(mags).sum()
 
     def distance_from(self, lon, lat):
         """
@@ -161,9 +241,10 @@ def _read_families_from_catalog_scan():
     """
     with open(config.build_families_outfile, 'r', encoding='utf-8') as fp:
         reader = csv.DictReader(fp)
-        old_family_number = -1
-        families = []
-        family = None
+        # group rows by family first, so that family attributes are
+        # computed only once per family, when all its events are known
+        family_events = {}
+        family_valid = {}
         for row in reader:
             ev = RequakeEvent()
             ev.evid = row['evid']
@@ -175,17 +256,14 @@ def _read_families_from_catalog_scan():
             ev.mag = float_or_none(row['mag'])
             ev.trace_id = row['trace_id']
             family_number = int(row['family_number'])
-            if family_number != old_family_number:
-                if family is not None:
-                    families.append(family)
-                family = Family()
-                family.number = family_number
-                old_family_number = family_number
-            family.append(ev)
-            family.valid = row['valid'] in ['True', 'true']
-        # append last family
-        if family is not None:
-            families.append(family)
+            family_events.setdefault(family_number, []).append(ev)
+            family_valid[family_number] = row['valid'] in ['True', 'true']
+    families = []
+    for family_number, events in family_events.items():
+        family = Family(family_number)
+        family.extend(events)
+        family.valid = family_valid[family_number]
+        families.append(family)
     return families
 
 
@@ -206,6 +284,7 @@ def _read_families_from_template_scan():
         trace_id = fname.lstrip(f'{catalog_name}.').rstrip('.txt')
         family_number = int(catalog_name.lstrip('catalog'))
         family = Family(family_number)
+        events = []
         with open(template_catalog, 'r', encoding='utf-8') as fp:
             for row in fp:
                 fields = row.split('|')
@@ -216,7 +295,8 @@ def _read_families_from_template_scan():
                 ev.lat = float(fields[3].strip())
                 ev.depth = float(fields[4].strip())
                 ev.trace_id = trace_id
-                family.append(ev)
+                events.append(ev)
+        family.extend(events)
         families.append(family)
     return families
 
@@ -244,8 +324,11 @@ def read_selected_families():
 
     :raises FamilyNotFoundError: if no family is found
     """
-    family_numbers = _build_family_number_list()
+    family_numbers = set(_build_family_number_list())
     families = read_families()
+    longerthan = config.args.longerthan
+    shorterthan = config.args.shorterthan
+    minevents = config.args.minevents
     families_selected = []
     for family in families:
         if family.number not in family_numbers:
@@ -253,16 +336,18 @@ def read_selected_families():
         if not family.valid:
             logger.warning(f'Family "{family.number}" is flagged as not valid')
             continue
-        if (family.endtime - family.starttime) < config.args.longerthan:
+        # timespan in seconds, computed once for both length checks
+        timespan = family.endtime - family.starttime
+        if timespan < longerthan:
             logger.warning(f'Family "{family.number}" is too short')
             continue
-        if (family.endtime - family.starttime) >= config.args.shorterthan:
+        if timespan >= shorterthan:
             logger.warning(f'Family "{family.number}" is too long')
             continue
-        if len(family) < config.args.minevents:
+        if len(family) < minevents:
             logger.warning(
                 f'Family "{family.number}" has less than '
-                f'{config.args.minevents} events'
+                f'{minevents} events'
             )
             continue
         families_selected.append(family)
@@ -275,8 +360,13 @@ def get_family(families, family_number):
     """
     Get a given family from a list of families.
 
-    :param families: List of families.
-    :type families: list of Family
+    When looking up many families, pass a dictionary of families indexed
+    by family number (see :func:`index_families`), so that each lookup
+    does not need to scan the whole list.
+
+    :param families: List of families, or dictionary of families indexed
+        by family number.
+    :type families: list of Family or dict
     :param family_number: Family number.
     :type family_number: int
     :return: The family.
@@ -285,17 +375,31 @@ def get_family(families, family_number):
     :raises FamilyNotFoundError: if no family is found
     :raises InvalidFamilyError: if the family is not valid
     """
-    for family in families:
-        if family.number != family_number:
-            continue
-        if not family.valid:
-            raise InvalidFamilyError(
-                f'Family "{family_number}" is flagged as not valid'
-            )
-        if (family.endtime - family.starttime) < config.args.longerthan:
-            raise InvalidFamilyError(f'Family "{family_number}" is too short')
-        return family
-    raise FamilyNotFoundError(f'No family found with number "{family_number}"')
+    if not isinstance(families, dict):
+        families = index_families(families)
+    family = families.get(family_number)
+    if family is None:
+        raise FamilyNotFoundError(
+            f'No family found with number "{family_number}"')
+    if not family.valid:
+        raise InvalidFamilyError(
+            f'Family "{family_number}" is flagged as not valid'
+        )
+    if (family.endtime - family.starttime) < config.args.longerthan:
+        raise InvalidFamilyError(f'Family "{family_number}" is too short')
+    return family
+
+
+def index_families(families):
+    """
+    Index a list of families by family number.
+
+    :param families: List of families.
+    :type families: list of Family
+    :return: Dictionary of families indexed by family number.
+    :rtype: dict
+    """
+    return {family.number: family for family in families}
 
 
 def get_family_waveforms(family):
@@ -312,15 +416,16 @@ def get_family_waveforms(family):
     st = Stream()
     nevs = len(family)
     clear_line = '\x1b[2K\r'  # escape sequence to clear line
-    for n, ev in enumerate(family):
-        sys.stdout.write(
-            f'{clear_line}Family {family.number}: '
-            f'reading waveform for event {ev.evid}: {n+1}/{nevs}')
-        try:
-            st += get_event_waveform(ev)
-        except NoWaveformError as msg:
+    sys.stdout.write(
+        f'{clear_line}Family {family.number}: '
+        f'reading waveforms for {nevs} events')
+    # results are returned in the same order as the events
+    for tr, err in get_event_waveforms(family):
+        if err is not None:
             sys.stdout.write('\n')
-            logger.error(msg)
+            logger.error(err)
+            continue
+        st += tr
     sys.stdout.write(
         f'{clear_line}Family {family.number}: reading waveforms: done.\n'
     )
@@ -348,9 +453,11 @@ def _build_family_number_list():
     """Build a list of family numbers from config option."""
     family_numbers = config.args.family_numbers
     if family_numbers == 'all':
+        # only parse the family_number column
         with open(config.build_families_outfile, 'r', encoding='utf-8') as fp:
-            reader = csv.DictReader(fp)
-            fn = sorted({int(row['family_number']) for row in reader})
+            reader = csv.reader(fp)
+            idx = next(reader).index('family_number')
+            fn = sorted({int(row[idx]) for row in reader})
         return fn
     try:
         if ',' in family_numbers:
@@ -55,9 +55,9 @@ def print_families():
         ('mag\nmin', '.1f'),
         ('mag\nmax', '.1f')
     ]
-    rows = []
-    for family in families:
-        row = [
+    # rows are generated lazily, so that CSV output is streamed
+    rows = (
+        [
             family.number,
             len(family),
             family.lon,
@@ -70,5 +70,6 @@ def print_families():
             family.magmin,
             family.magmax
         ]
-        rows.append(row)
+        for family in families
+    )
     generic_printer(rows, headers_fmt)
@@ -15,30 +15,32 @@ from .pairs import read_pairs_file
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
 
 
+headers_fmt = [
+    ('evid1', None),
+    ('evid2', None),
+    ('trace id', None),
+    ('origin time1', None),
+    ('lon1', '.4f'),
+    ('lat1', '.4f'),
+    ('depth1\n(km)', '.3f'),
+    ('mag1\ntype', None),
+    ('mag1', '.1f'),
+    ('origin time2', None),
+    ('lon2', '.4f'),
+    ('lat2', '.4f'),
+    ('depth2\n(km)', '.3f'),
+    ('mag2\ntype', None),
+    ('mag2', '.1f'),
+    ('lag\n(samp)', '.1f'),
+    ('lag\n(sec)', '.2f'),
+    ('cc\nmax', '.2f')
+]
+
+
 def print_pairs():
     """
     Print pairs to screen.
     """
-    headers_fmt = [
-        ('evid1', None),
-        ('evid2', None),
-        ('trace id', None),
-        ('origin time1', None),
-        ('lon1', '.4f'),
-        ('lat1', '.4f'),
-        ('depth1\n(km)', '.3f'),
-        ('mag1\ntype', None),
-        ('mag1', '.1f'),
-        ('origin time2', None),
-        ('lon2', '.4f'),
-        ('lat2', '.4f'),
-        ('depth2\n(km)', '.3f'),
-        ('mag2\ntype', None),
-        ('mag2', '.1f'),
-        ('lag\n(samp)', '.1f'),
-        ('lag\n(sec)', '.2f'),
-        ('cc\nmax', '.2f')
-    ]
     cc_min = config.args.cc_min if config.args.cc_min is not None else -1e99
     cc_max = config.args.cc_max if config.args.cc_max is not None else 1e99
     try:
@@ -10,6 +10,7 @@ Functions to compute seismic moment.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 import logging
+import numpy as np
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
 
 
@@ -17,15 +18,22 @@ def mag_to_moment(magnitude, unit='N.m'):
     """
     Convert magnitude to seismic moment.
 
-    :param magnitude: earthquake magnitude
-    :type magnitude: float
+    :param magnitude: earthquake magnitude, or array of magnitudes
+        (NaN values in the array are treated as missing magnitudes)
+    :type magnitude: float or numpy.ndarray
     :param unit: unit of the seismic moment, either 'N.m' or 'dyne.cm'
     :type unit: str
     :returns: seismic moment
-    :rtype: float
+    :rtype: float or numpy.ndarray
     """
     if magnitude is None:
         return 0
+    if isinstance(magnitude, np.ndarray) and np.isnan(magnitude).any():
+        # zero moment for missing magnitudes, as for scalar None magnitudes
+        valid = ~np.isnan(magnitude)
+        moment = np.zeros_like(magnitude)
+        moment[valid] = mag_to_moment(magnitude[valid], unit)
+        return moment
     if unit == 'N.m':
         moment = 10**(3/2*(magnitude+6.07))
     elif unit == 'dyne.cm':
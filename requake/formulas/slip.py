@@ -74,15 +74,22 @@ def mag_to_slip_in_cm(magnitude):
     """
     Convert magnitude to slip in cm.
 
-    :param magnitude: earthquake magnitude
-    :type magnitude: float
+    :param magnitude: earthquake magnitude, or array of magnitudes
+        (NaN values in the array are treated as missing magnitudes)
+    :type magnitude: float or numpy.ndarray
     :returns: slip in cm
-    :rtype: float
+    :rtype: float or numpy.ndarray
 
     :raises ValueError: if the magnitude-to-slip law is unknown
     """
     if magnitude is None:
         return 0
+    if isinstance(magnitude, np.ndarray) and np.isnan(magnitude).any():
+        # no slip for missing magnitudes, as for scalar None magnitudes
+        valid = ~np.isnan(magnitude)
+        slip = np.zeros_like(magnitude)
+        slip[valid] = mag_to_slip_in_cm(magnitude[valid])
+        return slip
     if config.mag_to_slip_model == 'NJ1998':
         moment = mag_to_moment(magnitude, unit='dyne.cm')
         return _nadeau_and_johnson_1998(moment)
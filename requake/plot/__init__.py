@@ -9,6 +9,13 @@ Plotting functions for Requake.
     GNU General Public License v3.0 or later
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
+import logging
+import matplotlib as mpl
+# Matplotlib setup, done once for all the plotting modules
+# Reduce logging level for Matplotlib to avoid DEBUG messages
+logging.getLogger('matplotlib').setLevel(logging.WARNING)
+# Make text editable in Illustrator
+mpl.rcParams['pdf.fonttype'] = 42
 from .plot_pair import plot_pair  # noqa
 from .plot_families import plot_families  # noqa
 from .plot_timespans import plot_timespans  # noqa
@@ -10,7 +10,6 @@ Plot families on a map.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 import logging
-import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.patheffects as patheffects
 import cartopy.crs as ccrs
@@ -19,7 +18,8 @@ from obspy.geodetics import gps2dist_azimuth
 from ..config import config, rq_exit
 from ..families import FamilyNotFoundError, read_selected_families
 from .plot_utils import (
-    plot_title, hover_annotation, duration_string, family_colors, plot_colorbar
+    plot_title, add_hover_annotation, duration_string, family_colors,
+    plot_colorbar
 )
 from .cached_tiler import CachedTiler
 from .map_tiles import (
@@ -31,11 +31,6 @@ from .map_tiles import (
     WorldStreetMap
 )
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
-# Reduce logging level for Matplotlib to avoid DEBUG messages
-mpl_logger = logging.getLogger('matplotlib')
-mpl_logger.setLevel(logging.WARNING)
-# Make text editable in Illustrator
-mpl.rcParams['pdf.fonttype'] = 42
 TILER = {
     'hillshade': EsriHillshade,
     'hillshade_dark': EsriHillshadeDark,
@@ -144,15 +139,5 @@ def map_families():
     plot_colorbar(fig, ax, cmap, norm)
     plot_title(
         ax, len(families), trace_ids, vertical_position=1.05, fontsize=10)
-
-    # Empty annotation that will be updated interactively
-    annot = ax.annotate(
-        '', xy=(0, 0), xytext=(5, 5),
-        textcoords='offset points',
-        bbox={'boxstyle': 'round', 'fc': 'w'},
-        zorder=20
-    )
-    annot.set_visible(False)
-    annot.hover_annotation = True
-    fig.canvas.mpl_connect('motion_notify_event', hover_annotation)
+    add_hover_annotation(fig, ax)
     plt.show()
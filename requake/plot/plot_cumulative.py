@@ -18,33 +18,25 @@ from ..config import config, rq_exit
 from ..families import FamilyNotFoundError, read_selected_families
 from ..formulas import mag_to_slip_in_cm, mag_to_moment
 from .plot_utils import (
-    format_time_axis, plot_title, hover_annotation, duration_string,
+    format_time_axis, plot_title, add_hover_annotation, duration_string,
     family_colors, plot_colorbar
 )
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
-# Reduce logging level for Matplotlib to avoid DEBUG messages
-mpl_logger = logging.getLogger('matplotlib')
-mpl_logger.setLevel(logging.WARNING)
-# Make text editable in Illustrator
-mpl.rcParams['pdf.fonttype'] = 42
 
 
 def _get_arrays(families):
     """
     Get arrays of times, cumulative quantities, and labels for families.
     """
-    times = [
-        [ev.orig_time.matplotlib_date for ev in family]
-        for family in families
-    ]
+    times = [family.matplotlib_dates for family in families]
     if config.args.quantity == 'slip':
         cumuls = [
-            np.cumsum([mag_to_slip_in_cm(ev.mag) for ev in family])
+            np.cumsum(mag_to_slip_in_cm(family.magnitudes))
             for family in families
         ]
     elif config.args.quantity == 'moment':
         cumuls = [
-            np.cumsum([mag_to_moment(ev.mag) for ev in family])
+            np.cumsum(mag_to_moment(family.magnitudes))
             for family in families
         ]
     elif config.args.quantity == 'number':
@@ -72,8 +64,8 @@ def _format_axes(ax, times, cumuls):
     ax.tick_params(which='both', top=True, labeltop=True)
     ax.tick_params(axis='x', which='both', direction='in')
     ax.callbacks.connect('xlim_changed', format_time_axis)
-    min_time = min(min(times) for times in times)
-    max_time = max(max(times) for times in times)
+    min_time = min(times.min() for times in times)
+    max_time = max(times.max() for times in times)
     timespan = max_time - min_time
     padding = timespan * 0.05
     ax.set_xlim(min_time-padding, max_time+padding)
@@ -128,23 +120,23 @@ def plot_cumulative():
     except ValueError as msg:
         logger.error(msg)
         rq_exit(1)
-    maxtime = max(max(time) for time in times)
-    mintime = min(min(time) for time in times)
+    maxtime = max(time.max() for time in times)
+    mintime = min(time.min() for time in times)
     maxtime += (maxtime - mintime) * 0.1
     mincumul = min(min(cumul) for cumul in cumuls)
     maxcumul = max(max(cumul) for cumul in cumuls)
     mincumul = max(mincumul - (maxcumul - mincumul) * 0.1, 0)
+    facecolors = []
+    edgecolors = []
     for time, cumul, label, color in zip(times, cumuls, labels, fcolors):
         brightness = 0.299 * color[0] + 0.587 * color[1] + 0.114 * color[2]
         linecolor = (0, 0, 0) if brightness > 0.8 else color
-        # fist plot just the markers
-        ax.scatter(
-            time, cumul, marker='o',
-            color=color, edgecolor=linecolor, label=label, zorder=20
-        )
+        # markers are plotted for all families at once, after the loop
+        facecolors += [color] * len(time)
+        edgecolors += [linecolor] * len(time)
         # add an extra point at the beginning and at the end to make the step
-        time = [time[0], ] + time + [maxtime, ]
-        cumul = [mincumul, ] + list(cumul) + [cumul[-1], ]
+        time = np.concatenate(([time[0]], time, [maxtime]))
+        cumul = np.concatenate(([mincumul], cumul, [cumul[-1]]))
         pe = []
         if linecolor != color:
             # add a patheffect to the line to give it a contrasting border
@@ -155,6 +147,11 @@ def plot_cumulative():
             time, cumul, where='post', lw=1, marker='', color=color,
             path_effects=pe, label=label, zorder=10
         )
+    # a single collection for the markers of all families
+    ax.scatter(
+        np.concatenate(times), np.concatenate(cumuls), marker='o',
+        facecolors=facecolors, edgecolors=edgecolors, zorder=20
+    )
 
     trace_ids = {family.trace_id for family in families if family.trace_id}
     plot_title(
@@ -163,15 +160,5 @@ def plot_cumulative():
     plot_colorbar(fig, ax, cmap, norm)
     # format axes after adding colorbar to avoid a visual glitch
     _format_axes(ax, times, cumuls)
-
-    # Empty annotation that will be updated interactively
-    annot = ax.annotate(
-        '', xy=(0, 0), xytext=(5, 5),
-        textcoords='offset points',
-        bbox={'boxstyle': 'round', 'fc': 'w'},
-        zorder=20
-    )
-    annot.set_visible(False)
-    annot.hover_annotation = True
-    fig.canvas.mpl_connect('motion_notify_event', hover_annotation)
+    add_hover_annotation(fig, ax)
     plt.show()
@@ -14,8 +14,10 @@ import logging
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.patheffects as PathEffects
-from obspy.signal.filter import envelope
-from obspy.signal.util import smooth
+from matplotlib.collections import LineCollection
+import numpy as np
+from scipy.fft import rfft, irfft
+from scipy.ndimage import uniform_filter1d
 from ..config import config, rq_exit
 from ..families import (
     FamilyNotFoundError,
@@ -24,11 +26,6 @@ from ..families import (
 )
 from ..waveforms import process_waveforms, NoWaveformError
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
-# Reduce logging level for Matplotlib to avoid DEBUG messages
-mpl_logger = logging.getLogger('matplotlib')
-mpl_logger.setLevel(logging.WARNING)
-# Make text editable in Illustrator
-mpl.rcParams['pdf.fonttype'] = 42
 # unbind some keys, that we use it for interacting with the plot
 mpl.rcParams['keymap.back'].remove('left')
 mpl.rcParams['keymap.forward'].remove('right')
@@ -37,6 +34,258 @@ with contextlib.suppress(KeyError):
     mpl.rcParams['keymap.all_axes'].remove('a')
 
 
+def _normalize_traces(st, t0, t1):
+    """
+    Normalize traces between t0 and t1, demean and scale them by 0.5.
+
+    Traces are aligned to the template and share the same sampling rate:
+    the processing is done on a single 2D array. Traces can have slightly
+    different lengths (e.g., at the edges of the waveform archive): in this
+    case, all the traces are trimmed to the length of the shortest one, while
+    normalization and mean are still computed on the full traces.
+
+    :param st: Stream of aligned traces
+    :type st: obspy.Stream
+    :param t0: Start time of the normalization window, relative to trace start
+    :type t0: float
+    :param t1: End time of the normalization window, relative to trace start
+    :type t1: float
+    :return: Normalized trace data, one row per trace
+    :rtype: numpy.ndarray
+    """
+    npts = min(len(tr.data) for tr in st)
+    data = np.vstack([tr.data[:npts] for tr in st]).astype(float, copy=False)
+    sampling_rate = st[0].stats.sampling_rate
+    # same samples as Trace.trim() with nearest_sample=True
+    idx0 = max(0, int(np.floor(t0*sampling_rate + 0.5)))
+    idx1 = int(np.floor(t1*sampling_rate + 0.5)) + 1
+    if all(len(tr.data) == npts for tr in st):
+        peak = np.abs(data[:, idx0:idx1]).max(axis=1, keepdims=True)
+        mean = data.mean(axis=1, keepdims=True)
+    else:
+        peak = np.array([[np.abs(tr.data[idx0:idx1]).max()] for tr in st])
+        mean = np.array([[tr.data.mean()] for tr in st])
+    # demean, normalize and scale: (data - mean) * 0.5/peak
+    data -= mean
+    data *= 0.5/peak
+    return data
+
+
+def _minmax_decimate(times, data, npoints):
+    """
+    Decimate traces for display, keeping the min and max values in each bin.
+
+    Data is split into npoints/2 bins and only the minimum and maximum
+    of each bin are kept. The peak envelope of the traces is preserved, so
+    that decimated traces look the same as the original ones, as long as
+    there are at least two bins per pixel.
+
+    :param times: Times, common to all traces
+    :type times: numpy.ndarray
+    :param data: Trace data, one row per trace
+    :type data: numpy.ndarray
+    :param npoints: Maximum number of points to keep for each trace
+    :type npoints: int
+    :return: Decimated times and data, one row per trace
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+    ntraces, npts = data.shape
+    nbins = npoints // 2
+    if nbins == 0 or npts <= npoints:
+        return np.broadcast_to(times, data.shape), data
+    binsize = npts // nbins
+    nbins = npts // binsize
+    nfull = nbins * binsize
+    blocks = data[:, :nfull].reshape(ntraces, nbins, binsize)
+    imin = blocks.argmin(axis=2)
+    imax = blocks.argmax(axis=2)
+    bin_starts = np.arange(nbins) * binsize
+    # keep min and max in time order, so that the line is continuous
+    idx = np.empty((ntraces, 2*nbins), dtype=int)
+    idx[:, 0::2] = bin_starts + np.minimum(imin, imax)
+    idx[:, 1::2] = bin_starts + np.maximum(imin, imax)
+    # samples beyond the last full bin are kept as they are
+    tail = np.broadcast_to(np.arange(nfull, npts), (ntraces, npts-nfull))
+    idx = np.hstack((idx, tail))
+    return times[idx], np.take_along_axis(data, idx, axis=1)
+
+
+def _visible_traces(times, data, xlim, npoints):
+    """
+    Return the decimated traces within a time window.
+
+    :param times: Times, common to all traces
+    :type times: numpy.ndarray
+    :param data: Trace data, one row per trace
+    :type data: numpy.ndarray
+    :param xlim: Time window
+    :type xlim: tuple of float
+    :param npoints: Maximum number of points to keep for each trace
+    :type npoints: int
+    :return: Decimated times and data, one row per trace
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+    # one more sample on each side, so that lines reach the axes borders
+    idx0, idx1 = np.searchsorted(times, xlim)
+    idx0 = max(idx0-1, 0)
+    idx1 = min(idx1+1, len(times))
+    return _minmax_decimate(times[idx0:idx1], data[:, idx0:idx1], npoints)
+
+
+def _trace_segments(xdata, ydata, offsets, scale):
+    """
+    Build the line segments to display traces.
+
+    :param xdata: Times, one row per trace
+    :type xdata: numpy.ndarray
+    :param ydata: Trace data, one row per trace
+    :type ydata: numpy.ndarray
+    :param offsets: Vertical offset of each trace
+    :type offsets: numpy.ndarray
+    :param scale: Amplitude scale factor
+    :type scale: float
+    :return: Segments, with shape (number of traces, number of points, 2)
+    :rtype: numpy.ndarray
+    """
+    segments = np.empty(ydata.shape + (2,))
+    segments[:, :, 0] = xdata
+    segments[:, :, 1] = ydata*scale + offsets[:, np.newaxis]
+    return segments
+
+
+def _hilbert(data):
+    """
+    Compute the Hilbert transform of a real signal, using a real FFT.
+
+    Same result as scipy.fftpack.hilbert, which is much slower for
+    signal lengths which are not products of small primes.
+
+    :param data: Signal
+    :type data: numpy.ndarray
+    :return: Hilbert transform of the signal
+    :rtype: numpy.ndarray
+    """
+    npts = len(data)
+    spectrum = rfft(data)
+    # multiply positive frequencies by i, zero DC and Nyquist frequencies
+    spectrum *= 1j
+    spectrum[0] = 0
+    if npts % 2 == 0:
+        spectrum[-1] = 0
+    return irfft(spectrum, npts)
+
+
+def _smoothed_envelope(data, smoothie):
+    """
+    Compute the envelope of a signal, smoothed by a moving average.
+
+    The envelope is computed as in obspy.signal.filter.envelope, but in
+    single precision (it is only used to compare it with thresholds) and
+    squaring, summing and square-rooting are all done in place on a single
+    array, avoiding intermediate copies of the signal.
+
+    The moving average is the same as obspy.signal.util.smooth: the average
+    of the smoothie values before and after each sample (the sample itself
+    excluded), with the first and last smoothie values kept constant.
+
+    :param data: Signal
+    :type data: numpy.ndarray
+    :param smoothie: Number of samples on each side of the moving average
+    :type smoothie: int
+    :return: Smoothed envelope
+    :rtype: numpy.ndarray
+    """
+    data = data.astype(np.float32, copy=False)
+    env = _hilbert(data)
+    env *= env
+    env += data*data
+    np.sqrt(env, out=env)
+    size = 2*smoothie + 1
+    smoothed = uniform_filter1d(env, size=size, mode='nearest')
+    # remove the central sample from the average
+    smoothed *= size
+    smoothed -= env
+    smoothed /= size - 1
+    smoothed[:smoothie] = smoothed[smoothie]
+    smoothed[-smoothie:] = smoothed[-smoothie-1]
+    return smoothed
+
+
+def _first_above(values, threshold):
+    """
+    Return the index of the first value above a threshold.
+
+    :param values: Values
+    :type values: numpy.ndarray
+    :param threshold: Threshold
+    :type threshold: float
+    :return: Index of the first value above threshold (0 if none)
+    :rtype: int
+    """
+    return int(np.argmax(values > threshold))
+
+
+def _last_above(values, threshold):
+    """
+    Return the index of the last value above a threshold.
+
+    :param values: Values
+    :type values: numpy.ndarray
+    :param threshold: Threshold
+    :type threshold: float
+    :return: Index of the last value above threshold (last index if none)
+    :rtype: int
+    """
+    return len(values) - 1 - int(np.argmax(values[::-1] > threshold))
+
+
+def _vertical_bars(xvalues, yvalues, half_height):
+    """
+    Build vertical segments centered on (xvalues, yvalues).
+
+    :param xvalues: X coordinates of the bars
+    :type xvalues: list of float
+    :param yvalues: Y coordinates of the bar centers
+    :type yvalues: numpy.ndarray
+    :param half_height: Half height of the bars
+    :type half_height: float
+    :return: Segments, with shape (number of bars, 2, 2)
+    :rtype: numpy.ndarray
+    """
+    xvalues = np.asarray(xvalues, dtype=float)
+    bars = np.empty((len(xvalues), 2, 2))
+    bars[:, :, 0] = xvalues[:, np.newaxis]
+    bars[:, 0, 1] = yvalues - half_height
+    bars[:, 1, 1] = yvalues + half_height
+    return bars
+
+
+def _trace_texts(tr):
+    """
+    Build the texts displayed for a trace.
+
+    :param tr: Trace
+    :type tr: obspy.Trace
+    :return: Event label (origin time), event info and mean CC texts.
+        Event label and mean CC text are None for the average trace.
+    :rtype: tuple of (str, str, str)
+    """
+    location_text = (
+        f'{tr.stats.ev_lon:.4f}°E {tr.stats.ev_lat:.4f}°N '
+        f'{tr.stats.ev_depth:.3f} km'
+    )
+    if 'average' in tr.stats.evid:
+        return None, location_text, None
+    event_label = tr.stats.orig_time.strftime('%Y-%m-%d\n%H:%M:%S')
+    mag_str = (
+        f'{tr.stats.mag_type} {tr.stats.mag:.1f}'
+        if tr.stats.mag else ''
+    )
+    info_text = f'{tr.stats.evid} {mag_str}\n{location_text}'
+    cc_text = f'CC mean {tr.stats.cc_mean:.2f}'
+    return event_label, info_text, cc_text
+
+
 def _plot_family(family):
     try:
         st = get_family_aligned_waveforms_and_template(family)
@@ -50,83 +299,90 @@ def _plot_family(family):
     # Use P_arrival and smooth envelope amplitude of first trace
     # to determine default time limits (if above values are None)
     tr0 = st[0]
-    env = smooth(envelope(tr0.data), 200)
+    env = _smoothed_envelope(tr0.data, smoothie=200)
     env_max = env.max()
     times = tr0.times()
     if t0 is None:
         # For t0, take the earliest time between 10% of envelope
         # and theoretical P arrival
-        p_arrival = tr0.stats.P_arrival_time - tr0.stats.starttime
+        p_arrival =\
+            tr0.stats.P_arrival_time.timestamp - tr0.stats.starttime.timestamp
         t0_p = p_arrival - 1
-        t0_env = times[env > 0.1*env_max][0]
+        t0_env = times[_first_above(env, 0.1*env_max)]
         t0 = min(t0_p, t0_env)
     if t1 is None:
-        t1 = times[env > 0.3*env_max][-1]
+        t1 = times[_last_above(env, 0.3*env_max)]
 
     fig, ax = plt.subplots(1, 1, figsize=(8, 8))
-    tracelines = []
-    p_bars = []
-    s_bars = []
-    for n, tr in enumerate(st.sort()):
-        average_trace = 'average' in tr.stats.evid
-        # Normalize trace between t0 and t1
-        tt0 = tr.stats.starttime + t0
-        tt1 = tr.stats.starttime + t1
-        tr2 = tr.copy().trim(tt0, tt1)
-        tr.data /= abs(tr2.max())
-        tr.detrend('demean')
-        tr.data *= 0.5
-        # substract t0, so that time axis starts at 0
+    trace_colors = []
+    p_arrivals = []
+    s_arrivals = []
+    st.sort()
+    data = _normalize_traces(st, t0, t1)
+    # all traces share the same sampling and are trimmed to the same length:
+    # substract t0, so that time axis starts at 0
+    trace_times = times[:data.shape[1]] - t0
+    trans = ax.get_yaxis_transform()
+    text_effects = [PathEffects.withStroke(linewidth=3, foreground='w')]
+    event_offsets = []
+    event_labels = []
+    trace_texts = [_trace_texts(tr) for tr in st]
+    for n, (tr, (event_label, info_text, cc_text)) in enumerate(
+            zip(st, trace_texts)):
+        average_trace = event_label is None
         color = '#cc8800' if average_trace else 'black'
-        l, = ax.plot(tr.times()-t0, tr.data+n, color=color, linewidth=0.5)
-        tracelines.append(l)
-        p_arrival = tr.stats.P_arrival_time - tr.stats.starttime - t0
-        s_arrival = tr.stats.S_arrival_time - tr.stats.starttime - t0
-        hh = 0.15  # pick line half-height
-        p_bar, = ax.plot((p_arrival, p_arrival), (n-hh, n+hh), color='g')
-        s_bar, = ax.plot((s_arrival, s_arrival), (n-hh, n+hh), color='r')
-        p_bars.append(p_bar)
-        s_bars.append(s_bar)
-        trans = ax.get_yaxis_transform()
+        trace_colors.append(color)
+        # plain float arithmetic on timestamps, avoiding UTCDateTime
+        # subtractions for every trace
+        tr_start = tr.stats.starttime.timestamp
+        p_arrivals.append(tr.stats.P_arrival_time.timestamp - tr_start - t0)
+        s_arrivals.append(tr.stats.S_arrival_time.timestamp - tr_start - t0)
         if average_trace:
-            y_label = 'average'
-            info_text = (
-                f'{tr.stats.ev_lon:.4f}°E {tr.stats.ev_lat:.4f}°N '
-                f'{tr.stats.ev_depth:.3f} km'
-            )
+            ax.text(
+                -0.01, n, 'average', transform=trans, ha='right',
+                va='center', color=color, fontsize=8, linespacing=1.5)
         else:
-            y_label = tr.stats.orig_time.strftime('%Y-%m-%d\n%H:%M:%S')
-            mag_str = (
-                f'{tr.stats.mag_type} {tr.stats.mag:.1f}'
-                if tr.stats.mag else ''
-            )
-            info_text = (
-                f'{tr.stats.evid} {mag_str}\n'
-                f'{tr.stats.ev_lon:.4f}°E {tr.stats.ev_lat:.4f}°N '
-                f'{tr.stats.ev_depth:.3f} km'
-            )
+            event_offsets.append(n)
+            event_labels.append(event_label)
         ax.text(
-            -0.01, n, y_label, transform=trans, ha='right', va='center',
-            color=color, fontsize=8, linespacing=1.5)
-        txt = ax.text(
             0.01, n+0.2, info_text, transform=trans,
-            color=color, fontsize=8, linespacing=1.5)
-        txt.set_path_effects(
-            [PathEffects.withStroke(linewidth=3, foreground='w')])
-        if not average_trace:
-            text = f'CC mean {tr.stats.cc_mean:.2f}'
-            txt = ax.text(
-                0.98, n+0.2, text, ha='right',
-                color=color, transform=trans, fontsize=8)
-            txt.set_path_effects(
-                [PathEffects.withStroke(linewidth=3, foreground='w')])
+            color=color, fontsize=8, linespacing=1.5,
+            path_effects=text_effects)
+        if cc_text is not None:
+            ax.text(
+                0.98, n+0.2, cc_text, ha='right',
+                color=color, transform=trans, fontsize=8,
+                path_effects=text_effects)
+    # draw all the traces and all the pick bars as line collections
+    offsets = np.arange(len(st))
+    # traces are decimated to two min/max bins per pixel
+    xdata, ydata = _visible_traces(
+        trace_times, data, (trace_times[0], trace_times[-1]),
+        4*int(ax.bbox.width))
+    tracelines = LineCollection(
+        _trace_segments(xdata, ydata, offsets, 1),
+        colors=trace_colors, linewidths=0.5)
+    if config.args.fast:
+        tracelines.set_antialiased(False)
+    ax.add_collection(tracelines)
+    hh = 0.15  # pick line half-height
+    p_bar = LineCollection(
+        _vertical_bars(p_arrivals, offsets, hh), colors='g')
+    s_bar = LineCollection(
+        _vertical_bars(s_arrivals, offsets, hh), colors='r')
+    ax.add_collection(p_bar)
+    ax.add_collection(s_bar)
+    ax.autoscale_view()
     legend = ax.legend(
         [p_bar, s_bar], ['P theo', 'S theo'], loc='lower right')
     legend.set_visible(False)
-    for ps_bar in p_bars + s_bars:
+    for ps_bar in p_bar, s_bar:
         ps_bar.set_visible(False)
-    ax.axes.yaxis.set_visible(False)
+    # event origin times are drawn by the y axis, as tick labels
+    ax.set_yticks(event_offsets)
+    ax.set_yticklabels(event_labels, va='center', linespacing=1.5)
     ax.minorticks_on()
+    ax.tick_params(axis='y', which='both', length=0, pad=4.5, labelsize=8)
     ax.tick_params(which='both', top=True, labeltop=False)
     ax.tick_params(axis='x', which='both', direction='in')
     ax.set_xlim(0, t1-t0)
@@ -140,67 +396,103 @@ def _plot_family(family):
     )
     ax.set_title(title, loc='right')
 
+    def _update_traces(*_args):
+        # decimate again the traces, only if time window or size changed
+        view = (ax.get_xlim(), 4*int(ax.bbox.width))
+        if view != _update_traces.view:
+            _update_traces.view = view
+            _update_traces.traces = _visible_traces(trace_times, data, *view)
+        tracelines.set_segments(_trace_segments(
+            *_update_traces.traces, offsets, _zoom_lines.scale))
+
+    _update_traces.view = None
+
     def _zoom_lines(zoom_level):
-        for line in tracelines:
-            ydata = line.get_ydata()
-            ymean = ydata.mean()
-            ydata = (ydata-ymean)*zoom_level + ymean
-            line.set_ydata(ydata)
-        fig.canvas.draw_idle()
+        # amplitude zoom only rescales the decimated traces
+        _zoom_lines.scale *= zoom_level
+        _update_traces()
 
-    def _time_zoom(ax, zoom_level):
+    _zoom_lines.scale = 1
+    _update_traces()
+    ax.callbacks.connect('xlim_changed', _update_traces)
+    fig.canvas.mpl_connect('resize_event', _update_traces)
+
+    def _time_window(ax, zoom_level, pan_amount):
+        # zoom around the window center and pan with a single set_xlim()
+        # call, so that traces are decimated only once
         xmin, xmax = ax.get_xlim()
-        xmean = 0.5*(xmin+xmax)
+        xmean = 0.5*(xmin+xmax) + pan_amount
         xspan = xmax-xmin
         xspan *= zoom_level
         xmin = xmean - 0.5*xspan
         xmax = xmean + 0.5*xspan
         ax.set_xlim(xmin, xmax)
-        fig.canvas.draw_idle()
-
-    def _pan_plot(ax, amount):
-        xlim = ax.get_xlim()
-        ax.set_xlim(xlim[0]+amount, xlim[1]+amount)
-        fig.canvas.draw_idle()
 
     def _toggle_arrivals():
         _toggle_arrivals.visible = not _toggle_arrivals.visible
-        for ps_bar in p_bars + s_bars:
+        for ps_bar in p_bar, s_bar:
             ps_bar.set_visible(_toggle_arrivals.visible)
         legend.set_visible(_toggle_arrivals.visible)
         fig.canvas.draw_idle()
 
     _toggle_arrivals.visible = False
 
+    def _apply_keypress():
+        # apply the zoom and pan accumulated by rapid key presses
+        # (e.g., when a key is held down) at once, with a single redraw
+        if _apply_keypress.zoom_level != 1:
+            _zoom_lines(_apply_keypress.zoom_level)
+        if (_apply_keypress.time_zoom_level != 1 or
+                _apply_keypress.pan_amount != 0):
+            _time_window(
+                ax, _apply_keypress.time_zoom_level,
+                _apply_keypress.pan_amount)
+        _apply_keypress.zoom_level = 1
+        _apply_keypress.time_zoom_level = 1
+        _apply_keypress.pan_amount = 0
+        fig.canvas.draw_idle()
+
+    _apply_keypress.zoom_level = 1
+    _apply_keypress.time_zoom_level = 1
+    _apply_keypress.pan_amount = 0
+    keypress_timer = fig.canvas.new_timer(interval=16)
+    keypress_timer.single_shot = True
+    keypress_timer.add_callback(_apply_keypress)
+
     def _keypress(event):
-        ax = event.canvas.figure.axes[0]
+        zoom_level = 1
+        time_zoom_level = 1
+        pan_amount = 0
         if event.key == 'up':
-            _keypress.zoom_level *= 2
-            _zoom_lines(2)
-        if event.key == 'down':
-            _keypress.zoom_level /= 2
-            _zoom_lines(0.5)
+            zoom_level = 2
+        elif event.key == 'down':
+            zoom_level = 0.5
         elif event.key == 'right':
-            _keypress.pan_amount += 1
-            _pan_plot(ax, 1)
+            pan_amount = 1
         elif event.key == 'left':
-            _keypress.pan_amount -= 1
-            _pan_plot(ax, -1)
+            pan_amount = -1
         elif event.key == 'shift+right':
-            _keypress.time_zoom_level /= 2
-            _time_zoom(ax, 0.5)
+            time_zoom_level = 0.5
         elif event.key == 'shift+left':
-            _keypress.time_zoom_level *= 2
-            _time_zoom(ax, 2)
+            time_zoom_level = 2
         elif event.key == '0':
-            _zoom_lines(1./_keypress.zoom_level)
-            _time_zoom(ax, 1./_keypress.time_zoom_level)
-            _pan_plot(ax, -_keypress.pan_amount)
-            _keypress.zoom_level = 1
-            _keypress.time_zoom_level = 1
-            _keypress.pan_amount = 0
+            zoom_level = 1./_keypress.zoom_level
+            time_zoom_level = 1./_keypress.time_zoom_level
+            pan_amount = -_keypress.pan_amount
         elif event.key == 'a':
             _toggle_arrivals()
+            return
+        else:
+            return
+        _keypress.zoom_level *= zoom_level
+        _keypress.time_zoom_level *= time_zoom_level
+        _keypress.pan_amount += pan_amount
+        _apply_keypress.zoom_level *= zoom_level
+        _apply_keypress.time_zoom_level *= time_zoom_level
+        _apply_keypress.pan_amount += pan_amount
+        # restart the timer, so that rapid key presses are coalesced
+        keypress_timer.stop()
+        keypress_timer.start()
 
     _keypress.zoom_level = 1
     _keypress.time_zoom_level = 1
@@ -225,6 +517,9 @@ def plot_families():
             'See "requake plot_families -h" for information on '
             'how to select specific families.')
         families = families[:20]
+    if config.args.fast:
+        # simplify trace paths, removing details smaller than one pixel
+        mpl.rcParams['path.simplify_threshold'] = 1.0
     for family in families:
         _plot_family(family)
     print('''
@@ -10,8 +10,8 @@ Download and plot traces for an event pair.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 import logging
-import matplotlib as mpl
 import matplotlib.pyplot as plt
+import numpy as np
 from ..config import config, rq_exit
 from ..catalog import fix_non_locatable_events, read_stored_catalog
 from ..waveforms import (
@@ -19,11 +19,6 @@ from ..waveforms import (
     NoWaveformError
 )
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
-# Reduce logging level for Matplotlib to avoid DEBUG messages
-mpl_logger = logging.getLogger('matplotlib')
-mpl_logger.setLevel(logging.WARNING)
-# Make text editable in Illustrator
-mpl.rcParams['pdf.fonttype'] = 42
 
 
 def _get_pair():
@@ -38,15 +33,21 @@ def _get_pair():
     :raises FileNotFoundError: If the catalog file is not found.
     """
     catalog = read_stored_catalog()
-    fix_non_locatable_events(catalog)
-    evid1 = config.args.evid1
-    evid2 = config.args.evid2
+    evids = (config.args.evid1, config.args.evid2)
+    events = {}
+    # stop scanning the catalog as soon as both events are found
+    for ev in catalog:
+        if ev.evid in evids and ev.evid not in events:
+            events[ev.evid] = ev
+            if len(events) == len(set(evids)):
+                break
     pair = []
-    for evid in evid1, evid2:
-        found_events = [e for e in catalog if e.evid == evid]
-        if not found_events:
+    for evid in evids:
+        if evid not in events:
             raise ValueError(f'Event {evid} not found in catalog')
-        pair.append(found_events[0])
+        pair.append(events[evid])
+    # only the events of the pair need to be fixed
+    fix_non_locatable_events(pair)
     return pair
 
 
@@ -101,10 +102,22 @@ def plot_pair():
     lw = 0.8  # linewidth
     data1 = tr1.data
     data2 = tr2.data
-    ax[0].plot(tr2.times(), data2, color='gray', lw=lw, label=stats2.evid)
-    ax[0].plot(tr1.times(), data1, color='blue', lw=lw, label=label1)
-    ax[1].plot(tr1.times(), data1, color='gray', lw=lw, label=stats1.evid)
-    ax[1].plot(tr2.times(), data2, color='blue', lw=lw, label=label2)
+    # relative times only depend on npts and sampling rate (and on the
+    # mask of masked data), which are usually the same for the two traces
+    times1 = tr1.times()
+    if (
+        (stats2.npts, stats2.sampling_rate) ==
+        (stats1.npts, stats1.sampling_rate)
+        and not np.ma.isMaskedArray(data1)
+        and not np.ma.isMaskedArray(data2)
+    ):
+        times2 = times1
+    else:
+        times2 = tr2.times()
+    ax[0].plot(times2, data2, color='gray', lw=lw, label=stats2.evid)
+    ax[0].plot(times1, data1, color='blue', lw=lw, label=label1)
+    ax[1].plot(times1, data1, color='gray', lw=lw, label=stats1.evid)
+    ax[1].plot(times2, data2, color='blue', lw=lw, label=label2)
     ax[1].set_xlabel('Time (s)')
     for _ax in ax:
         _ax.set(ylim=[-1, 1], ylabel='Normalized amplitude')
@@ -10,21 +10,16 @@ Plot family timespans.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 import logging
-import matplotlib as mpl
+from operator import attrgetter, methodcaller
 import matplotlib.pyplot as plt
 import numpy as np
 from ..config import config, rq_exit
 from ..families import FamilyNotFoundError, read_selected_families
 from .plot_utils import (
-    format_time_axis, plot_title, hover_annotation, duration_string,
+    format_time_axis, plot_title, add_hover_annotation, duration_string,
     family_colors, plot_colorbar
 )
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
-# Reduce logging level for Matplotlib to avoid DEBUG messages
-mpl_logger = logging.getLogger('matplotlib')
-mpl_logger.setLevel(logging.WARNING)
-# Make text editable in Illustrator
-mpl.rcParams['pdf.fonttype'] = 42
 
 
 ylabels = {
@@ -36,10 +31,23 @@ ylabels = {
     'time': 'Family Start Time',
 }
 
+# Family attribute getters for the y values ("distance_from" is handled
+# separately, since it depends on the reference point)
+_yval_getters = {
+    'depth': attrgetter('depth'),
+    'family_number': attrgetter('number'),
+    'latitude': attrgetter('lat'),
+    'longitude': attrgetter('lon'),
+    'time': attrgetter('starttime.matplotlib_date'),
+}
+
 
-def _plot_family_timespans(family, ax, sort_by, lon0, lat0, color):
+def _plot_family_timespans(family, ax, yval, color):
     """
-    Plot the timespan of a single family.
+    Plot the timespan of a single family, at the given y value.
+
+    Event markers are not plotted here: the marker positions and edge color
+    are returned, so that markers for all families are drawn at once.
     """
     fn = family.number
     nevents = len(family)
@@ -49,25 +57,16 @@ def _plot_family_timespans(family, ax, sort_by, lon0, lat0, color):
         f'{family.depth:.1f} km'
         f'\n{nevents} evts {duration_str}'
     )
-    times = [ev.orig_time.matplotlib_date for ev in family]
-    if sort_by == 'depth':
-        yvals = np.ones(len(times)) * family.depth
-    elif sort_by == 'distance_from':
-        yvals = np.ones(len(times)) * family.distance_from(lon0, lat0)
-    elif sort_by == 'family_number':
-        yvals = np.ones(len(times)) * fn
-    elif sort_by == 'latitude':
-        yvals = np.ones(len(times)) * family.lat
-    elif sort_by == 'longitude':
-        yvals = np.ones(len(times)) * family.lon
-    elif sort_by == 'time':
-        yvals = np.ones(len(times)) * family.starttime.matplotlib_date
+    times = family.matplotlib_dates
     brightness = 0.299 * color[0] + 0.587 * color[1] + 0.114 * color[2]
     linecolor = (0, 0, 0) if brightness > 0.8 else color
+    # y is constant for a family: a two-point line is enough to draw the
+    # timespan, the events are drawn separately as markers
     ax.plot(
-        times, yvals, lw=1, marker='o',
-        color=linecolor, mfc=color, mec=linecolor, label=label
+        [times[0], times[-1]], [yval, yval], lw=1,
+        color=linecolor, label=label
     )
+    return times, np.full(len(times), yval), linecolor
 
 
 def plot_timespans():
@@ -103,16 +102,34 @@ def plot_timespans():
             'but "distance_from_lon" and/or "distance_from_lat" '
             'are not specified')
         rq_exit(1)
+    if sort_by == 'distance_from':
+        get_yval = methodcaller('distance_from', lon0, lat0)
+    else:
+        get_yval = _yval_getters[sort_by]
     try:
         fcolors, norm, cmap = family_colors(families)
     except ValueError as msg:
         logger.error(msg)
         rq_exit(1)
     trace_ids = []
+    marker_x = []
+    marker_y = []
+    facecolors = []
+    edgecolors = []
     for family, color in zip(families, fcolors):
         if family.trace_id not in trace_ids and family.trace_id is not None:
             trace_ids.append(family.trace_id)
-        _plot_family_timespans(family, ax, sort_by, lon0, lat0, color)
+        times, yvals, linecolor = _plot_family_timespans(
+            family, ax, get_yval(family), color)
+        marker_x.append(times)
+        marker_y.append(yvals)
+        facecolors += [color] * len(times)
+        edgecolors += [linecolor] * len(times)
+    # a single collection for the event markers of all families
+    ax.scatter(
+        np.concatenate(marker_x), np.concatenate(marker_y), marker='o',
+        linewidths=1, facecolors=facecolors, edgecolors=edgecolors, zorder=3
+    )
     ax.callbacks.connect('xlim_changed', format_time_axis)
     if sort_by == 'time':
         ax.callbacks.connect(
@@ -127,15 +144,5 @@ def plot_timespans():
         ax, len(families), trace_ids, vertical_position=1.05, fontsize=10)
     ax.hover_annotation_element = 'lines'
     plot_colorbar(fig, ax, cmap, norm)
-
-    # Empty annotation that will be updated interactively
-    annot = ax.annotate(
-        '', xy=(0, 0), xytext=(5, 5),
-        textcoords='offset points',
-        bbox={'boxstyle': 'round', 'fc': 'w'},
-        zorder=20
-    )
-    annot.set_visible(False)
-    annot.hover_annotation = True
-    fig.canvas.mpl_connect('motion_notify_event', hover_annotation)
+    add_hover_annotation(fig, ax)
     plt.show()
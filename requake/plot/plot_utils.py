@@ -11,17 +11,63 @@ Plot utils.
 """
 import logging
 import contextlib
+from bisect import bisect_right
+from operator import attrgetter
 import matplotlib.dates as mdates
 import numpy as np
 from matplotlib import cm, colors
+from matplotlib.cbook import STEP_LOOKUP_MAP
 from ..config import config
 from .colormaps import cmaps
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
 
 
+def _time_axis_bucket(timespan):
+    """
+    Return the tick bucket for a time axis spanning a given number of days.
+
+    :param timespan: Timespan in days
+    :type timespan: float
+    :return: Tick bucket: 'years', 'months' or 'days'
+    :rtype: str
+    """
+    if timespan > 2*365:
+        return 'years'
+    if timespan > 365/2:
+        return 'months'
+    return 'days'
+
+
+def _time_axis_locators(bucket):
+    """
+    Build new major locator, major formatter and minor locator for a bucket.
+
+    :param bucket: Tick bucket, as returned by _time_axis_bucket()
+    :type bucket: str
+    :return: Major locator, major formatter, minor locator
+    :rtype: tuple
+    """
+    if bucket == 'years':
+        _major_locator = mdates.YearLocator()   # every year
+        _major_fmt = mdates.DateFormatter('%Y')
+        _minor_locator = mdates.MonthLocator()  # every month
+        return _major_locator, _major_fmt, _minor_locator
+    _major_locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
+    _major_fmt = mdates.ConciseDateFormatter(_major_locator)
+    if bucket == 'months':
+        _minor_locator = mdates.MonthLocator()  # every month
+    else:
+        _minor_locator = mdates.DayLocator()  # every day
+    return _major_locator, _major_fmt, _minor_locator
+
+
 def format_time_axis(ax, which='xaxis', grid=True):
     """
     Format the time axis of a Matplotlib plot.
+
+    Locators and formatters are only replaced when the timespan moves to
+    a different tick bucket, since this function is called on every
+    zoom or pan.
     """
     if which == 'both':
         axes = [ax.xaxis, ax.yaxis]
@@ -31,27 +77,24 @@ def format_time_axis(ax, which='xaxis', grid=True):
         axes = [ax.yaxis]
     else:
         raise ValueError(f'Invalid value for "which": {which}')
+    changed = False
     for axis in axes:
         dmin, dmax = axis.get_view_interval()
-        timespan = dmax-dmin
-        if timespan > 2*365:
-            _major_locator = mdates.YearLocator()   # every year
-            _major_fmt = mdates.DateFormatter('%Y')
-            _minor_locator = mdates.MonthLocator()  # every month
-        else:
-            _major_locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
-            _major_fmt = mdates.ConciseDateFormatter(_major_locator)
-            if timespan > 365/2:
-                _minor_locator = mdates.MonthLocator()  # every month
-            else:
-                _minor_locator = mdates.DayLocator()  # every day
+        bucket = _time_axis_bucket(dmax-dmin)
+        if getattr(axis, 'time_axis_format', None) == (bucket, grid):
+            continue
+        axis.time_axis_format = (bucket, grid)
+        changed = True
+        _major_locator, _major_fmt, _minor_locator =\
+            _time_axis_locators(bucket)
         axis.set_major_locator(_major_locator)
         axis.set_major_formatter(_major_fmt)
         axis.set_minor_locator(_minor_locator)
         if grid:
             axis.grid(True, which='major', linestyle='--', color='0.5')
             axis.grid(True, which='minor', linestyle=':', color='0.8')
-    ax.figure.canvas.draw()
+    if changed:
+        ax.figure.canvas.draw_idle()
 
 
 def plot_title(
@@ -79,12 +122,248 @@ def plot_title(
         title_right, loc='right', y=vertical_position, fontsize=fontsize)
 
 
+def _hover_elements(ax, hover_on):
+    """
+    Return the annotation and the elements to annotate on hover.
+
+    The result is cached on the axes and recomputed only when artists
+    are added to or removed from the axes. Each element gets its color
+    and a contrasting text color as attributes, so that they are not
+    recomputed at every mouse event.
+
+    :param ax: Matplotlib axis
+    :type ax: matplotlib.axes.Axes
+    :param hover_on: Type of elements to annotate: 'lines' or 'markers'
+    :type hover_on: str
+    :return: Annotation (None if not found), elements to annotate
+    :rtype: matplotlib.text.Annotation, tuple
+    """
+    cache_key = (
+        hover_on, len(ax.lines), len(ax.collections), len(ax.texts))
+    cache = getattr(ax, 'hover_annotation_cache', None)
+    if cache is not None and cache[0] == cache_key:
+        return cache[1], cache[2]
+    annot = next(
+        (
+            child for child in ax.get_children()
+            if getattr(child, 'hover_annotation', False)
+        ),
+        None
+    )
+    if hover_on == 'lines':
+        elements = tuple(ax.get_lines())
+    elif hover_on == 'markers':
+        elements = tuple(
+            el for el in ax.collections if getattr(el, 'to_annotate', False))
+    else:
+        elements = ()
+    # store element colors and contrasting annotation text colors
+    for element in elements:
+        if hover_on == 'lines':
+            color = colors.to_rgba(element.get_color())
+        else:
+            color = tuple(element.get_facecolor()[0])
+        element.hover_color = color
+        element.hover_contrast_color =\
+            'k' if color[0] + color[1] + color[2] > 1.8 else 'w'
+    ax.hover_annotation_cache = (cache_key, annot, elements)
+    return annot, elements
+
+
+def _hovered_marker(ax, markers, event):
+    """
+    Find the first marker under the mouse pointer.
+
+    Marker positions and radii are computed in display coordinates and
+    cached on the axes until the view changes, so that each mouse event
+    only requires a vectorized distance test.
+
+    :param ax: Matplotlib axis
+    :type ax: matplotlib.axes.Axes
+    :param markers: Markers to test (one-point scatter collections)
+    :type markers: tuple
+    :param event: Matplotlib event
+    :type event: matplotlib.backend_bases.MouseEvent
+    :return: The hovered marker, or None
+    :rtype: matplotlib.collections.PathCollection
+    """
+    if not markers:
+        return None
+    view_key = (markers, tuple(ax.viewLim.bounds), tuple(ax.bbox.bounds))
+    cache = getattr(ax, 'hover_marker_cache', None)
+    if cache is None or cache[0] != view_key:
+        xy = np.array([
+            marker.get_offset_transform().transform(marker.get_offsets())[0]
+            for marker in markers
+        ])
+        points_to_pixels = ax.figure.dpi / 72
+        radius = np.array([
+            np.sqrt(marker.get_sizes()[0]) / 2 * points_to_pixels
+            + marker.get_pickradius()
+            for marker in markers
+        ])
+        cache = (view_key, xy, radius**2)
+        ax.hover_marker_cache = cache
+    _view_key, xy, radius2 = cache
+    dist2 = (xy[:, 0] - event.x)**2 + (xy[:, 1] - event.y)**2
+    hits = np.flatnonzero(dist2 <= radius2)
+    return markers[hits[0]] if hits.size else None
+
+
+def _hovered_line(ax, lines, event):
+    """
+    Find the first line under the mouse pointer.
+
+    This is the same test as Line2D.contains(), vectorized over all the
+    lines: line vertices and segments are computed in display coordinates
+    and cached on the axes until the view changes.
+
+    :param ax: Matplotlib axis
+    :type ax: matplotlib.axes.Axes
+    :param lines: Lines to test
+    :type lines: tuple
+    :param event: Matplotlib event
+    :type event: matplotlib.backend_bases.MouseEvent
+    :return: The hovered line, or None
+    :rtype: matplotlib.lines.Line2D
+    """
+    if not lines:
+        return None
+    view_key = (lines, tuple(ax.viewLim.bounds), tuple(ax.bbox.bounds))
+    cache = getattr(ax, 'hover_line_cache', None)
+    if cache is None or cache[0] != view_key:
+        points_to_pixels = ax.figure.dpi / 72
+        vertices = []
+        for line in lines:
+            # vertices as drawn, including steps
+            xdata, ydata = line.get_xydata().T
+            xdata, ydata = STEP_LOOKUP_MAP[line.get_drawstyle()](xdata, ydata)
+            vertices.append(
+                line.get_transform().transform(np.column_stack((xdata, ydata)))
+            )
+        line_index = np.repeat(
+            np.arange(len(lines)), [len(xy) for xy in vertices])
+        xy = np.concatenate(vertices)
+        radius = np.array([
+            line.get_pickradius() * points_to_pixels for line in lines])
+        has_line = np.array([
+            line.get_linestyle() not in ('None', None) for line in lines])
+        # segments join consecutive vertices of the same line
+        segments = np.flatnonzero(
+            (line_index[:-1] == line_index[1:]) & has_line[line_index[:-1]])
+        start = xy[segments]
+        delta = xy[segments+1] - start
+        cache = (
+            view_key, xy, line_index, radius[line_index]**2,
+            segments, start, delta, (delta**2).sum(axis=1)
+        )
+        ax.hover_line_cache = cache
+    (_view_key, xy, line_index, radius2,
+     segments, start, delta, length2) = cache
+    point_hits = (xy[:, 0] - event.x)**2 + (xy[:, 1] - event.y)**2 <= radius2
+    with np.errstate(all='ignore'):
+        # position of the nearest point on each segment
+        u = (
+            (event.x - start[:, 0]) * delta[:, 0] +
+            (event.y - start[:, 1]) * delta[:, 1]
+        ) / length2
+        nearest = start + u[:, np.newaxis] * delta
+        segment_hits = (u >= 0) & (u <= 1) & (
+            (nearest[:, 0] - event.x)**2 + (nearest[:, 1] - event.y)**2
+            <= radius2[segments]
+        )
+    hits = np.concatenate(
+        (line_index[point_hits], line_index[segments[segment_hits]]))
+    return lines[hits.min()] if hits.size else None
+
+
+def _set_highlight(element, hover_on, highlighted):
+    """
+    Highlight a hovered element, or restore its normal style.
+
+    :param element: Line or marker to highlight
+    :type element: matplotlib.artist.Artist
+    :param hover_on: Type of element: 'lines' or 'markers'
+    :type hover_on: str
+    :param highlighted: Whether to highlight or restore the element
+    :type highlighted: bool
+    """
+    element.set_linewidth(3 if highlighted else 1)
+    if hover_on == 'markers':
+        element.set_edgecolor(
+            element.hover_contrast_color if highlighted else 'w')
+
+
+def _draw_hover_overlay(ax, annot):
+    """
+    Draw the hovered element and the annotation on top of the axes.
+
+    The hovered element is only highlighted while it is drawn here, so
+    that the highlight never ends up in the cached background. Lines and
+    collections stacked above the hovered element are drawn again, to
+    keep the drawing order.
+
+    :param ax: Matplotlib axis
+    :type ax: matplotlib.axes.Axes
+    :param annot: Hover annotation
+    :type annot: matplotlib.text.Annotation
+    """
+    hovered = getattr(ax, 'hover_annotation_last', None)
+    if hovered is None:
+        return
+    hover_on = ax.hover_annotation_element
+    # an animated artist does not mark the figure as stale when its
+    # properties change, so the temporary highlight triggers no redraw
+    hovered.set_animated(True)
+    _set_highlight(hovered, hover_on, True)
+    ax.draw_artist(hovered)
+    _set_highlight(hovered, hover_on, False)
+    hovered.set_animated(False)
+    zorder = hovered.get_zorder()
+    above = sorted(
+        (
+            artist for artist in ax.lines + ax.collections
+            if artist.get_zorder() > zorder and artist.get_visible()
+            and not artist.get_animated()
+        ),
+        key=lambda artist: artist.get_zorder()
+    )
+    for artist in above:
+        ax.draw_artist(artist)
+    ax.draw_artist(annot)
+
+
+def _save_hover_background(event, ax, annot):
+    """
+    Cache the figure background after a full draw, for hover blitting.
+
+    :param event: Matplotlib draw event
+    :type event: matplotlib.backend_bases.DrawEvent
+    :param ax: Matplotlib axis
+    :type ax: matplotlib.axes.Axes
+    :param annot: Hover annotation
+    :type annot: matplotlib.text.Annotation
+    """
+    canvas = event.canvas
+    # e.g., vector backends used by savefig() cannot blit
+    if not getattr(canvas, 'supports_blit', False):
+        return
+    fig = ax.get_figure()
+    ax.hover_background = (
+        tuple(fig.bbox.bounds), canvas.copy_from_bbox(fig.bbox))
+    _draw_hover_overlay(ax, annot)
+
+
 def hover_annotation(event):
     """
     Show annotation on hover.
 
     This function is called when the mouse hovers over a line or a marker.
 
+    When the canvas supports it, the annotation and the hovered element
+    are blitted on top of the background cached at the last full draw,
+    so that hovering does not redraw the whole figure.
+
     :param event: Matplotlib event
     :type event: matplotlib.backend_bases.MouseEvent
     """
@@ -95,77 +374,98 @@ def hover_annotation(event):
     if hover_on is None:
         return
     fig = ax.get_figure()
-    try:
-        annot = [
-            child for child in ax.get_children()
-            if getattr(child, 'hover_annotation', False)
-        ][0]
-    except IndexError:
+    annot, elements = _hover_elements(ax, hover_on)
+    if annot is None:
         return
-    vis = annot.get_visible()
-    if hover_on == 'lines':
-        elements = ax.get_lines()
-    elif hover_on == 'markers':
-        elements = [
-            el for el in ax.collections if getattr(el, 'to_annotate', False)]
+    if hover_on == 'markers':
+        hovered = _hovered_marker(ax, elements, event)
     else:
+        hovered = _hovered_line(ax, elements, event)
+    last_hovered = getattr(ax, 'hover_annotation_last', None)
+    # only update artists and redraw when the hovered element changes
+    if hovered is last_hovered:
         return
-    for element in elements:
-        cont, _ind = element.contains(event)
-        if cont:
-            if hover_on == 'lines':
-                color = element.get_color()
-            elif hover_on == 'markers':
-                color = element.get_facecolor()[0]
-            element.set_linewidth(3)
-            annot.xy = (event.xdata, event.ydata)
-            # set a color contrasting with the element color
-            contrast_color = 'k' if sum(color[:3]) > 1.8 else 'w'
-            if hover_on == 'markers':
-                element.set_edgecolor(contrast_color)
-            annot.set_color(contrast_color)
-            annot.set_text(element.get_label())
-            annot.get_bbox_patch().set_facecolor(color)
-            annot.get_bbox_patch().set_alpha(0.8)
-            annot.set_visible(True)
-            fig.canvas.draw_idle()
-            break
-        element.set_linewidth(1)
-        if hover_on == 'markers':
-            element.set_edgecolor('w')
-        if vis:
-            annot.set_visible(False)
-            fig.canvas.draw_idle()
+    ax.hover_annotation_last = hovered
+    if hovered is not None:
+        annot.xy = (event.xdata, event.ydata)
+        # set a color contrasting with the element color
+        annot.set_color(hovered.hover_contrast_color)
+        annot.set_text(hovered.get_label())
+        annot.get_bbox_patch().set_facecolor(hovered.hover_color)
+        annot.get_bbox_patch().set_alpha(0.8)
+    annot.set_visible(hovered is not None)
+    background = getattr(ax, 'hover_background', None)
+    if annot.get_animated() and background is not None\
+            and background[0] == tuple(fig.bbox.bounds):
+        fig.canvas.restore_region(background[1])
+        _draw_hover_overlay(ax, annot)
+        fig.canvas.blit(fig.bbox)
+        return
+    if not annot.get_animated():
+        # no blitting: highlight the element and redraw the figure
+        if last_hovered is not None:
+            _set_highlight(last_hovered, hover_on, False)
+        if hovered is not None:
+            _set_highlight(hovered, hover_on, True)
+    fig.canvas.draw_idle()
+
+
+def add_hover_annotation(fig, ax):
+    """
+    Add an empty annotation that will be updated interactively on hover.
+
+    The type of elements to annotate is read from the
+    ``hover_annotation_element`` attribute of the axes.
+
+    :param fig: Matplotlib figure
+    :type fig: matplotlib.figure.Figure
+    :param ax: Matplotlib axis
+    :type ax: matplotlib.axes.Axes
+    """
+    annot = ax.annotate(
+        '', xy=(0, 0), xytext=(5, 5),
+        textcoords='offset points',
+        bbox={'boxstyle': 'round', 'fc': 'w'},
+        zorder=20
+    )
+    annot.set_visible(False)
+    annot.hover_annotation = True
+    if fig.canvas.supports_blit:
+        # the annotation is only drawn by _draw_hover_overlay()
+        annot.set_animated(True)
+        fig.canvas.mpl_connect(
+            'draw_event',
+            lambda event: _save_hover_background(event, ax, annot))
+    fig.canvas.mpl_connect('motion_notify_event', hover_annotation)
+
+
+_duration_unit_names = (
+    'years', 'months', 'days', 'hours', 'minutes', 'seconds')
+# Multipliers to convert a duration in years to each unit
+_duration_multipliers = (
+    1, 12, 12*30, 12*30*24, 12*30*24*60, 12*30*24*60*60)
+# Minimum duration in years for each unit, in increasing order
+_duration_thresholds = tuple(1/m for m in reversed(_duration_multipliers))
 
 
 def _duration_units(duration):
     """
     Return the duration and the units.
 
+    The units are the largest ones for which the duration is at least 1.
+
     :param duration: Duration in years
     :type duration: float
     :return: Duration, units
     :rtype: float, str
     """
-    units = 'years'
-    if duration < 1:
-        duration *= 12
-        units = 'months'
-    if duration < 1:
-        duration *= 30
-        units = 'days'
-    if duration < 1:
-        duration *= 24
-        units = 'hours'
-    if duration < 1:
-        duration *= 60
-        units = 'minutes'
-    if duration < 1:
-        duration *= 60
-        units = 'seconds'
-    return duration, units
+    nunits = len(_duration_unit_names)
+    idx = min(
+        nunits - 1, nunits - bisect_right(_duration_thresholds, duration))
+    return duration * _duration_multipliers[idx], _duration_unit_names[idx]
 
 
+_years_per_second = 1/(365*24*60*60)
 _short_units = {
     'years': 'yrs',
     'months': 'mos',
@@ -185,7 +485,10 @@ def duration_string(family):
     :return: Duration string
     :rtype: str
     """
-    duration = (family.endtime - family.starttime)/(365*24*60*60)
+    duration = (family.endtime - family.starttime) * _years_per_second
+    # most families last more than one year
+    if duration >= 1:
+        return f'{duration:.1f} yrs'
     duration, units = _duration_units(duration)
     return f'{duration:.1f} {_short_units[units]}'
 
@@ -202,24 +505,32 @@ def _minmax(values):
     """
     vmin = np.nanmin(values)
     vmax = np.nanmax(values)
-    if config.args.range is not None:
+    value_range = config.args.range
+    if value_range is not None:
         try:
             if config.args.colorby == 'time':
-                vmin, vmax = mdates.datestr2num(config.args.range.split(','))
+                vmin, vmax = mdates.datestr2num(value_range.split(','))
             else:
-                vmin, vmax = map(float, config.args.range.split(','))
+                vmin, vmax = map(float, value_range.split(','))
         except ValueError:
             logger.error(
-                f'Invalid value for "range": "{config.args.range}". '
+                f'Invalid value for "range": "{value_range}". '
                 'Using min/max values instead'
             )
     return vmin, vmax
 
 
+_family_colors_cache = {}
+
+
 def family_colors(families):
     """
     Return the family colors, according to the colorby parameter.
 
+    Results are cached, using the colorby parameter, the color range,
+    the reference point and the number and size of each family as key.
+    Use family_colors.cache_clear() if families are modified in place.
+
     :param families: List of families
     :type families: list
     :return: List of colors, normalization object, colormap
@@ -229,53 +540,120 @@ def family_colors(families):
         lat0 are not specified when colorby is 'distance_from'
     """
     colorby = config.args.colorby
-    try:
-        cmap = cmaps[colorby]
-        logger.info(f'Using Matplotlib colormap "{cmap.name}"')
-    except KeyError as err:
-        raise ValueError(f'Invalid value for "colorby": {colorby}') from err
+    cache_key = (
+        colorby, config.args.range,
+        config.distance_from_lon, config.distance_from_lat,
+        tuple((family.number, len(family)) for family in families)
+    )
+    with contextlib.suppress(KeyError):
+        return _family_colors_cache[cache_key]
+    result = _family_colors(families, colorby)
+    _family_colors_cache[cache_key] = result
+    return result
+
+
+family_colors.cache_clear = _family_colors_cache.clear
+
+
+# Family attribute getters for the general "colorby" cases
+_colorby_getters = {
+    'cumul_moment': attrgetter('cumul_moment'),
+    'cumul_slip': attrgetter('cumul_slip'),
+    'depth': attrgetter('depth'),
+    'latitude': attrgetter('lat'),
+    'longitude': attrgetter('lon'),
+    'slip_rate': attrgetter('slip_rate'),
+    'time': attrgetter('starttime.matplotlib_date'),
+}
+
+
+def _family_colors(families, colorby):
+    """
+    Compute the family colors, according to the colorby parameter.
+
+    :param families: List of families
+    :type families: list
+    :param colorby: Quantity to color families by
+    :type colorby: str
+    :return: List of colors, normalization object, colormap
+    :rtype: list, matplotlib.colors.Normalize, matplotlib.cm.ScalarMappable
+
+    :raises ValueError: If the colorby parameter is invalid or if lon0 and/or
+        lat0 are not specified when colorby is 'distance_from'
+    """
+    cmap = cmaps.get(colorby)
+    if cmap is None:
+        raise ValueError(f'Invalid value for "colorby": {colorby}')
+    logger.info(f'Using Matplotlib colormap "{cmap.name}"')
     # special cases
     if colorby == 'family_number':
         norm = colors.Normalize(vmin=-0.5, vmax=9.5)
-        fcolors = [cmap(norm(family.number % 10)) for family in families]
-        return fcolors, norm, cmap
+        # only ten colors are possible: index a precomputed RGBA table
+        colors_tab = cmap(norm(np.arange(10)))
+        last_digits = np.fromiter(
+            (family.number % 10 for family in families), dtype=int,
+            count=len(families))
+        return [tuple(rgba) for rgba in colors_tab[last_digits]], norm, cmap
     if colorby == 'duration':
         return _family_colors_duration(families, cmap)
     if colorby == 'number_of_events':
         return _family_color_number_of_events(families, cmap)
     # general cases
-    if colorby == 'cumul_moment':
-        values = [family.cumul_moment for family in families]
-    elif colorby == 'cumul_slip':
-        values = [family.cumul_slip for family in families]
-    elif colorby == 'depth':
-        values = [family.depth for family in families]
-    elif colorby == 'distance_from':
+    if colorby == 'distance_from':
         lon0, lat0 = config.distance_from_lon, config.distance_from_lat
         if lon0 is None or lat0 is None:
             raise ValueError(
                 '"colorby" set to "distance_from", '
                 'but "distance_from_lon" and/or "distance_from_lat" '
                 'are not specified in the config file')
-        values = [family.distance_from(lon0, lat0) for family in families]
+        values = (family.distance_from(lon0, lat0) for family in families)
         cmap.label = f'{cmap.label} ({lat0:.1f}°N,{lon0:.1f}°E) (km)'
-    elif colorby == 'latitude':
-        values = [family.lat for family in families]
-    elif colorby == 'longitude':
-        values = [family.lon for family in families]
-    elif colorby == 'slip_rate':
-        values = [
-            family.slip_rate if family.slip_rate is not np.inf
-            else np.nan for family in families
-        ]
-    elif colorby == 'time':
-        values = [family.starttime.matplotlib_date for family in families]
-    # Convert values to float numpy array. This changes None values to np.nan
-    values = np.array(values, dtype=float)
+    else:
+        values = map(_colorby_getters[colorby], families)
+    values = _float_array(values, len(families))
+    if colorby == 'slip_rate':
+        # infinite slip rates (zero-duration families) are not colored
+        values[np.isinf(values)] = np.nan
     vmin, vmax = _minmax(values)
     norm = colors.Normalize(vmin, vmax)
-    fcolors = [cmap(norm(value)) for value in values]
-    return fcolors, norm, cmap
+    return _rgba_list(cmap, norm, values), norm, cmap
+
+
+def _float_array(values, count):
+    """
+    Convert an iterable of values to a float numpy array.
+
+    None values are converted to np.nan.
+
+    :param values: Iterable of values
+    :type values: iterable
+    :param count: Number of values
+    :type count: int
+    :return: Array of values
+    :rtype: numpy.ndarray
+    """
+    return np.fromiter(
+        (np.nan if value is None else value for value in values),
+        dtype=float, count=count
+    )
+
+
+def _rgba_list(cmap, norm, values):
+    """
+    Map an array of values to a list of RGBA colors.
+
+    The colormap is evaluated once on the whole array.
+
+    :param cmap: Colormap
+    :type cmap: matplotlib.colors.Colormap
+    :param norm: Normalization object
+    :type norm: matplotlib.colors.Normalize
+    :param values: Array of values
+    :type values: numpy.ndarray
+    :return: List of RGBA colors
+    :rtype: list of tuple
+    """
+    return [tuple(rgba) for rgba in cmap(norm(values))]
 
 
 def _family_color_number_of_events(families, cmap):
@@ -289,13 +667,16 @@ def _family_color_number_of_events(families, cmap):
     :return: List of colors, normalization object, colormap
     :rtype: list, matplotlib.colors.Normalize, matplotlib.cm.ScalarMappable
     """
-    values = [len(family) for family in families]
-    boundaries = np.arange(min(values), max(values)+1)
+    values = np.fromiter(
+        (len(family) for family in families), dtype=int,
+        count=len(families))
+    vmin, vmax = values.min(), values.max()
+    boundaries = np.arange(vmin, vmax+1)
     if len(boundaries) % 2 == 0:
-        boundaries = np.append(boundaries, max(values)+1)
+        boundaries = np.append(boundaries, vmax+1)
     boundaries = boundaries - 0.5
     norm = colors.BoundaryNorm(boundaries, cmap.N)
-    return [cmap(norm(value)) for value in values], norm, cmap
+    return _rgba_list(cmap, norm, values), norm, cmap
 
 
 def _family_colors_duration(families, cmap):
@@ -309,18 +690,48 @@ def _family_colors_duration(families, cmap):
     :return: List of colors, normalization object, colormap
     :rtype: list, matplotlib.colors.Normalize, matplotlib.cm.ScalarMappable
     """
-    durations = [family.duration for family in families]
+    durations = _float_array(
+        (family.duration for family in families), len(families))
     min_duration, max_duration = _minmax(durations)
     max_duration_new_units, units = _duration_units(max_duration)
     multiplier = max_duration_new_units/max_duration
     min_duration_new_units = min_duration*multiplier
     norm = colors.Normalize(
         vmin=min_duration_new_units, vmax=max_duration_new_units)
-    fcolors = [cmap(norm(duration*multiplier)) for duration in durations]
+    fcolors = _rgba_list(cmap, norm, durations*multiplier)
     cmap.label = f'{cmap.label} ({units})'
     return fcolors, norm, cmap
 
 
+_scalar_mappable_cache = {}
+
+
+def _scalar_mappable(cmap, norm):
+    """
+    Return a ScalarMappable for a colormap and a normalization object.
+
+    ScalarMappables are cached, so that the same colormap and
+    normalization (e.g., returned by the family_colors() cache) reuse
+    the same object.
+
+    :param cmap: Colormap
+    :type cmap: matplotlib.colors.Colormap
+    :param norm: Normalization object
+    :type norm: matplotlib.colors.Normalize
+    :return: ScalarMappable
+    :rtype: matplotlib.cm.ScalarMappable
+    """
+    cache_key = (id(cmap), id(norm))
+    with contextlib.suppress(KeyError):
+        sm = _scalar_mappable_cache[cache_key]
+        # ids can be reused by new objects: check that they are the same
+        if sm.cmap is cmap and sm.norm is norm:
+            return sm
+    sm = cm.ScalarMappable(cmap=cmap, norm=norm)
+    _scalar_mappable_cache[cache_key] = sm
+    return sm
+
+
 def plot_colorbar(fig, ax, cmap, norm):
     """
     Add a colorbar to a plot.
@@ -335,7 +746,7 @@ def plot_colorbar(fig, ax, cmap, norm):
     :type norm: matplotlib.colors.Normalize
     """
     colorby = config.args.colorby
-    sm = cm.ScalarMappable(cmap=cmap, norm=norm)
+    sm = _scalar_mappable(cmap, norm)
     cbar_ticks = None
     if colorby == 'family_number':
         cbar_ticks = range(10)
@@ -9,16 +9,19 @@ Catalog-based repeater scan for Requake.
     GNU General Public License v3.0 or later
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
+import signal
 import logging
 import csv
-from math import factorial
-from itertools import combinations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from tqdm import tqdm
 from obspy.geodetics import gps2dist_azimuth
 from ..config import config, rq_exit
 from ..catalog import fix_non_locatable_events, read_stored_catalog
 from ..waveforms import (
     get_waveform_pair, cc_waveform_pair,
+    download_metadata,
     NoWaveformError, NoMetadataError, MetadataMismatchError
 )
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
@@ -32,8 +35,163 @@ def _pair_ok(pair):
     return distance <= config.catalog_search_range
 
 
+def _init_worker(config_items):
+    """
+    Initialize a worker process for the pair cross-correlation.
+
+    :param config_items: configuration of the main process
+    :type config_items: dict
+    """
+    # Ctrl-C is handled by the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    config.update(config_items)
+
+
+def _process_pair(pair_st):
+    """
+    Cross-correlate the waveforms of an event pair.
+
+    :param pair_st: stream containing the two traces of the pair
+    :type pair_st: obspy.Stream
+    :return: output CSV row for the pair
+    :rtype: list
+    """
+    tr1, tr2 = pair_st.traces
+    lag, lag_sec, cc_max = cc_waveform_pair(tr1, tr2)
+    stats1 = tr1.stats
+    stats2 = tr2.stats
+    return [
+        stats1.evid, stats2.evid, tr1.id,
+        stats1.orig_time, stats1.ev_lon, stats1.ev_lat,
+        stats1.ev_depth, stats1.mag_type, stats1.mag,
+        stats2.orig_time, stats2.ev_lon, stats2.ev_lat,
+        stats2.ev_depth, stats2.mag_type, stats2.mag,
+        lag, lag_sec, cc_max
+    ]
+
+
+def _process_pair_chunk(items):
+    """
+    Cross-correlate a chunk of event pairs, in a worker process.
+
+    :param items: for each pair, the stream containing its two traces,
+        or a message explaining why no waveform data is available
+    :type items: list of obspy.Stream or str
+    :return: one (row, message) tuple per pair; row is None if no waveform
+        data is available
+    :rtype: list of tuple
+    """
+    return [
+        (None, item) if isinstance(item, str) else (_process_pair(item), None)
+        for item in items
+    ]
+
+
+def _get_pair_chunk_waveforms(pairs):
+    """
+    Get the waveforms of a chunk of event pairs, in the main process.
+
+    Waveforms are downloaded here, and not by the worker processes,
+    so that each event waveform is only downloaded once and only one
+    connection at a time is open to the data center.
+
+    :param pairs: event pairs
+    :type pairs: list of tuple of RequakeEvent
+    :return: for each pair, the stream containing its two traces, or a
+        message explaining why no waveform data is available
+    :rtype: list of obspy.Stream or str
+    """
+    items = []
+    for pair in pairs:
+        try:
+            items.append(get_waveform_pair(pair))
+        except NoWaveformError as msg:
+            items.append(str(msg))
+    return items
+
+
+def _spherical_distances(lat, lon, lats, lons):
+    """
+    Compute distances on a sphere between one point and an array of points.
+
+    :param lat: latitude of the point (radians)
+    :type lat: float
+    :param lon: longitude of the point (radians)
+    :type lon: float
+    :param lats: latitudes of the points (radians)
+    :type lats: numpy.ndarray
+    :param lons: longitudes of the points (radians)
+    :type lons: numpy.ndarray
+    :return: distances (km)
+    :rtype: numpy.ndarray
+    """
+    # haversine formula
+    a = (
+        np.sin((lats - lat) / 2)**2 +
+        np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2)**2
+    )
+    return 2 * 6371. * np.arcsin(np.sqrt(a))
+
+
+def _pair_chunks(catalog, chunksize=256):
+    """
+    Build chunks of event pairs to be cross-correlated.
+
+    Pairs of events which are too far from each other are discarded here,
+    so that they are not sent to the worker processes.
+    Most of them are discarded through a vectorized spherical distance;
+    the remaining pairs are checked with the exact (ellipsoidal) distance.
+
+    :param catalog: event catalog
+    :type catalog: RequakeCatalog
+    :param chunksize: number of pairs to be processed per chunk
+    :type chunksize: int
+    :return: number of examined pairs and pairs to be processed,
+        for each chunk
+    :rtype: generator of tuple of (int, list)
+    """
+    lats = np.radians([ev.lat for ev in catalog])
+    lons = np.radians([ev.lon for ev in catalog])
+    # the spherical distance differs from the ellipsoidal one
+    # by less than 0.6%
+    max_distance = config.catalog_search_range * 1.01
+    nexamined = 0
+    chunk = []
+    for i, ev1 in enumerate(catalog):
+        distances = _spherical_distances(
+            lats[i], lons[i], lats[i+1:], lons[i+1:])
+        nexamined += len(distances)
+        for j in np.flatnonzero(distances <= max_distance) + i + 1:
+            pair = (ev1, catalog[j])
+            if not _pair_ok(pair):
+                continue
+            chunk.append(pair)
+            if len(chunk) == chunksize:
+                yield nexamined, chunk
+                nexamined = 0
+                chunk = []
+    if nexamined:
+        yield nexamined, chunk
+
+
+def _write_results(results, writer):
+    """Write the results for a chunk of event pairs."""
+    # all the rows of the chunk are written with a single call
+    writer.writerows([row for row, _msg in results if row is not None])
+    for row, msg in results:
+        # Do not print empty messages
+        if row is None and msg:
+            logger.warning(msg)
+
+
 def _process_pairs(fp_out, nevents, catalog):
-    """Process event pairs."""
+    """
+    Process event pairs.
+
+    Waveforms are downloaded by the main process, while pairs are
+    cross-correlated in parallel by worker processes.
+    Results are written in the same order as the pairs.
+    """
     fieldnames = [
         'evid1', 'evid2', 'trace_id',
         'orig_time1', 'lon1', 'lat1', 'depth_km1', 'mag_type1', 'mag1',
@@ -42,34 +200,47 @@ def _process_pairs(fp_out, nevents, catalog):
     ]
     writer = csv.writer(fp_out)
     writer.writerow(fieldnames)
-    npairs = int(factorial(nevents)/(factorial(2)*factorial(nevents-2)))
+    npairs = nevents * (nevents - 1) // 2
     logger.info(f'Processing {npairs:n} event pairs')
-    with tqdm(total=npairs, unit='pairs', unit_scale=True) as pbar:
-        for pair in combinations(catalog, 2):
-            pbar.update()
-            if not _pair_ok(pair):
-                continue
-            try:
-                pair_st = get_waveform_pair(pair)
-                tr1, tr2 = pair_st.traces
-                lag, lag_sec, cc_max = cc_waveform_pair(tr1, tr2)
-                stats1 = tr1.stats
-                stats2 = tr2.stats
-                writer.writerow([
-                    stats1.evid, stats2.evid, tr1.id,
-                    stats1.orig_time, stats1.ev_lon, stats1.ev_lat,
-                    stats1.ev_depth, stats1.mag_type, stats1.mag,
-                    stats2.orig_time, stats2.ev_lon, stats2.ev_lat,
-                    stats2.ev_depth, stats2.mag_type, stats2.mag,
-                    lag, lag_sec, cc_max
-                ])
-            except (NoMetadataError, MetadataMismatchError) as msg:
-                logger.error(msg)
-                rq_exit(1)
-            except NoWaveformError as msg:
-                # Do not print empty messages
-                if str(msg):
-                    logger.warning(msg)
+    # download metadata once, before sending the configuration to the
+    # worker processes
+    if config.inventory is None:
+        try:
+            download_metadata()
+        except NoMetadataError as msg:
+            logger.error(msg)
+            rq_exit(1)
+    nworkers = config.catalog_scan_workers
+    executor = ProcessPoolExecutor(
+        max_workers=nworkers,
+        initializer=_init_worker, initargs=(dict(config),)
+    )
+    # only a few chunks per worker are queued at a time, to avoid
+    # building all the pairs in memory
+    pending = deque()
+    try:
+        with tqdm(total=npairs, unit='pairs', unit_scale=True) as pbar:
+            for nchunk, pairs in _pair_chunks(catalog):
+                items = _get_pair_chunk_waveforms(pairs)
+                pending.append(
+                    (nchunk, executor.submit(_process_pair_chunk, items)))
+                if len(pending) < 2 * nworkers:
+                    continue
+                nchunk, future = pending.popleft()
+                _write_results(future.result(), writer)
+                pbar.update(nchunk)
+            while pending:
+                nchunk, future = pending.popleft()
+                _write_results(future.result(), writer)
+                pbar.update(nchunk)
+    except (NoMetadataError, MetadataMismatchError) as msg:
+        logger.error(msg)
+        rq_exit(1)
+    finally:
+        # cancel the queued chunks, e.g., on errors or Ctrl-C
+        for _nchunk, future in pending:
+            future.cancel()
+        executor.shutdown()
     return npairs
 
 
@@ -91,7 +262,11 @@ def scan_catalog():
     logger.info(f'{nevents} events read from catalog file')
     logger.info('Building event pairs...')
     logger.info('Computing waveform cross-correlation...')
-    with open(config.scan_catalog_pairs_file, 'w', encoding='utf-8') as fp_out:
+    # a large write buffer reduces the number of system calls
+    with open(
+        config.scan_catalog_pairs_file, 'w', encoding='utf-8', newline='',
+        buffering=1 << 20
+    ) as fp_out:
         npairs = _process_pairs(fp_out, nevents, catalog)
     logger.info(f'Processed {npairs:n} event pairs')
     logger.info(f'Done! Output written to {config.scan_catalog_pairs_file}')
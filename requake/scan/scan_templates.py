@@ -12,6 +12,10 @@ Scan a continuous waveform stream using one or more templates.
 import logging
 import os
 import sys
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from obspy import read
 from ..config import config, rq_exit
 from ..families import (
@@ -19,13 +23,14 @@ from ..families import (
     FamilyNotFoundError
 )
 from ..waveforms import (
-    get_waveform, cc_waveform_pair, get_arrivals,
+    get_waveform, cc_waveform_pair, prepare_template, get_arrivals,
     NoWaveformError
 )
 from ..catalog import RequakeEvent, generate_evid
 from .._version import get_versions
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
-trace_cache = {}
+# templates used by the worker processes
+worker_templates = []
 
 
 def _build_event(tr, template, p_arrival_absolute_time):
@@ -66,36 +71,126 @@ def _cc_detection(tr, template, lag_sec):
     p_arrival_absolute_time = tr.stats.starttime + p_arrival
     t0 = p_arrival_absolute_time - config.cc_pre_P
     t1 = t0 + config.cc_trace_length
-    tr2 = tr.copy().trim(t0, t1)
+    # slice() does not copy the data of the whole trace
+    tr2 = tr.slice(t0, t1)
     _, _, cc_max = cc_waveform_pair(tr2, template)
     return cc_max, p_arrival_absolute_time
 
 
-def _scan_family_template(template, catalog_file, t0, t1):
-    trace_id = template.id
-    key = f'{t0}_{trace_id}'
-    try:
-        tr = trace_cache[key]
-    except KeyError:
-        try:
-            tr = get_waveform(trace_id, t0, t1)
-            trace_cache[key] = tr
-        except NoWaveformError as err:
-            raise NoWaveformError(
-                f'No data for {trace_id} : {t0} - {t1}'
-            ) from err
-    sys.stdout.write(str(tr) + '\r')
+def _scan_family_template(template, tr):
+    """
+    Scan a waveform trace using a template.
+
+    :param template: template trace
+    :type template: obspy.Trace
+    :param tr: waveform trace
+    :type tr: obspy.Trace
+    :return: catalog line for the detected event, or None
+    :rtype: str
+    """
     # We use the time_chunk length as max shift
     config.cc_max_shift = config.time_chunk
     _lag, lag_sec, cc_max, cc_mad = cc_waveform_pair(tr, template, mode='scan')
     cc_peak = cc_max/cc_mad
-    if cc_peak > config.min_cc_mad_ratio:
-        cc_max, p_arrival_absolute_time = _cc_detection(tr, template, lag_sec)
-        ev = _build_event(tr, template, p_arrival_absolute_time)
-        catalog_file.write(f'{ev.fdsn_text()}|{cc_max:.2f}\n')
+    if cc_peak <= config.min_cc_mad_ratio:
+        return None
+    cc_max, p_arrival_absolute_time = _cc_detection(tr, template, lag_sec)
+    ev = _build_event(tr, template, p_arrival_absolute_time)
+    return f'{ev.fdsn_text()}|{cc_max:.2f}\n'
+
+
+def _init_worker(config_items, templates):
+    """
+    Initialize a worker process for the template scan.
+
+    :param config_items: configuration of the main process
+    :type config_items: dict
+    :param templates: templates from prepare_template()
+    :type templates: list of obspy.Trace
+    """
+    # Ctrl-C is handled by the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    config.update(config_items)
+    worker_templates[:] = templates
+
+
+def _scan_time_window(traces, t0, t1):
+    """
+    Scan a time window using all the templates, in a worker process.
+
+    :param traces: waveform trace for each trace id, or None if there is
+        no data for that trace id
+    :type traces: dict
+    :param t0: start time
+    :type t0: obspy.UTCDateTime
+    :param t1: end time
+    :type t1: obspy.UTCDateTime
+    :return: template signature and catalog line for each detection,
+        and warning messages
+    :rtype: tuple of (list of tuple, list of str)
+    """
+    detections = []
+    warnings = []
+    for template in worker_templates:
+        tr = traces[template.id]
+        if tr is None:
+            warnings.append(f'No data for {template.id} : {t0} - {t1}')
+            continue
+        line = _scan_family_template(template, tr)
+        if line is not None:
+            template_signature =\
+                f'{template.stats.family_number:02d}.{template.id}'
+            detections.append((template_signature, line))
+    return detections, warnings
+
+
+def _write_detections(results, catalog_files):
+    """Write the detections for a time window to the catalog files."""
+    detections, warnings = results
+    for msg in warnings:
+        logger.warning(msg)
+    for template_signature, line in detections:
+        catalog_file = catalog_files[template_signature]
+        catalog_file.write(line)
         catalog_file.flush()
 
 
+def _time_windows():
+    """
+    Generate the time windows to be scanned.
+
+    :return: start and end time of each time window
+    :rtype: generator of tuple of (UTCDateTime, UTCDateTime)
+    """
+    time = config.template_start_time
+    time_chunk = config.time_chunk
+    overlap = config.time_chunk_overlap
+    while time <= config.template_end_time:
+        yield time, time + time_chunk + overlap
+        time += time_chunk
+
+
+def _request_waveforms(executor, trace_ids, t0, t1):
+    """
+    Start downloading the waveforms for a time window.
+
+    :param executor: executor used for the downloads
+    :type executor: concurrent.futures.Executor
+    :param trace_ids: trace ids to download
+    :type trace_ids: list of str
+    :param t0: start time
+    :type t0: obspy.UTCDateTime
+    :param t1: end time
+    :type t1: obspy.UTCDateTime
+    :return: one future per trace id
+    :rtype: dict
+    """
+    return {
+        trace_id: executor.submit(get_waveform, trace_id, t0, t1)
+        for trace_id in trace_ids
+    }
+
+
 def _read_template_from_file():
     """
     Read a template from a file provided by the user.
@@ -176,22 +271,56 @@ def scan_templates():
         logger.error(msg)
         rq_exit(1)
     catalog_files = _template_catalog_files(templates)
-    time = config.template_start_time
-    time_chunk = config.time_chunk
-    overlap = config.time_chunk_overlap
-    while time <= config.template_end_time:
-        for template in templates:
-            template_signature =\
-                f'{template.stats.family_number:02d}.{template.id}'
-            catalog_file = catalog_files[template_signature]
-            try:
-                t0 = time
-                t1 = time + time_chunk + overlap
-                _scan_family_template(template, catalog_file, t0, t1)
-            except NoWaveformError as msg:
-                logger.warning(msg)
-                continue
-        trace_cache.clear()
-        time += time_chunk
+    # templates are processed only once for all the time windows
+    templates = [prepare_template(template) for template in templates]
+    # templates for the same trace id share the same waveforms
+    trace_ids = list(dict.fromkeys(template.id for template in templates))
+    # waveforms for the next time windows are downloaded in the background,
+    # while time windows are scanned in parallel by worker processes
+    nprefetch = config.waveform_download_workers
+    nworkers = config.template_scan_workers or os.cpu_count() or 1
+    time_windows = _time_windows()
+    pending = deque()
+    scans = deque()
+    downloader = ThreadPoolExecutor(max_workers=nprefetch)
+    executor = ProcessPoolExecutor(
+        max_workers=nworkers, initializer=_init_worker,
+        initargs=(dict(config), templates)
+    )
+    try:
+        for t0, t1 in islice(time_windows, nprefetch):
+            pending.append(
+                (t0, t1, _request_waveforms(downloader, trace_ids, t0, t1)))
+        while pending:
+            t0, t1, futures = pending.popleft()
+            for t0_next, t1_next in islice(time_windows, 1):
+                pending.append((
+                    t0_next, t1_next,
+                    _request_waveforms(
+                        downloader, trace_ids, t0_next, t1_next)
+                ))
+            traces = {}
+            for trace_id, future in futures.items():
+                try:
+                    traces[trace_id] = future.result()
+                except NoWaveformError:
+                    traces[trace_id] = None
+                    continue
+                sys.stdout.write(str(traces[trace_id]) + '\r')
+            scans.append(executor.submit(_scan_time_window, traces, t0, t1))
+            # detections are written in time order
+            if len(scans) >= 2 * nworkers:
+                _write_detections(scans.popleft().result(), catalog_files)
+        while scans:
+            _write_detections(scans.popleft().result(), catalog_files)
+    finally:
+        # cancel the queued downloads and scans, e.g., on errors or Ctrl-C
+        for _t0, _t1, futures in pending:
+            for future in futures.values():
+                future.cancel()
+        for future in scans:
+            future.cancel()
+        downloader.shutdown()
+        executor.shutdown()
     for fp in catalog_files.values():
         fp.close()
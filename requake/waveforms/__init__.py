@@ -10,14 +10,16 @@ Functions for waveform analysis.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 from .waveforms import (  # noqa
-    get_waveform, get_event_waveform,
-    get_waveform_pair, cc_waveform_pair,
+    get_waveform, get_cached_waveform, get_event_waveform,
+    get_event_waveforms,
+    get_waveform_pair, cc_waveform_pair, prepare_template,
     process_waveforms,
     align_pair, align_traces,
     build_template,
     NoWaveformError
 )
 from .station_metadata import (  # noqa
-    get_traceid_coords, NoMetadataError, MetadataMismatchError
+    download_metadata, get_traceid_coords,
+    NoMetadataError, MetadataMismatchError
 )
 from .arrivals import get_arrivals  # noqa
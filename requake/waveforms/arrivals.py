@@ -10,10 +10,13 @@ Functions for computing P and S arrivals.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 import logging
+import threading
 from obspy.geodetics import gps2dist_azimuth, locations2degrees
 from obspy.taup import TauPyModel
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
 model = TauPyModel(model='ak135')
+# TauPyModel is not guaranteed to be thread-safe
+model_lock = threading.Lock()
 
 
 def get_arrivals(trace_lat, trace_lon, ev_lat, ev_lon, ev_depth):
@@ -32,12 +35,13 @@ def get_arrivals(trace_lat, trace_lon, ev_lat, ev_lon, ev_depth):
     distance, _, _ = gps2dist_azimuth(
         trace_lat, trace_lon, ev_lat, ev_lon)
     distance /= 1e3
-    p_arrivals = model.get_travel_times(
-        source_depth_in_km=ev_depth,
-        distance_in_degree=dist_deg,
-        phase_list=['p', 'P'])
-    s_arrivals = model.get_travel_times(
-        source_depth_in_km=ev_depth,
-        distance_in_degree=dist_deg,
-        phase_list=['s', 'S'])
+    with model_lock:
+        p_arrivals = model.get_travel_times(
+            source_depth_in_km=ev_depth,
+            distance_in_degree=dist_deg,
+            phase_list=['p', 'P'])
+        s_arrivals = model.get_travel_times(
+            source_depth_in_km=ev_depth,
+            distance_in_degree=dist_deg,
+            phase_list=['s', 'S'])
     return p_arrivals[0], s_arrivals[0], distance, dist_deg
@@ -10,10 +10,13 @@ Functions for downloading station metadata.
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
 import logging
+import threading
 from obspy import Inventory
 from obspy.clients.fdsn.header import FDSNNoDataException
 from ..config import config
 logger = logging.getLogger(__name__.rsplit('.', maxsplit=1)[-1])
+# metadata can be requested concurrently by waveform download threads
+metadata_lock = threading.Lock()
 
 
 class NoMetadataError(Exception):
@@ -78,7 +81,9 @@ def get_traceid_coords(orig_time=None):
     :raises MetadataMismatchError: if coordinates are not found
     """
     if config.inventory is None:
-        download_metadata()
+        with metadata_lock:
+            if config.inventory is None:
+                download_metadata()
     traceid_coords = {}
     for trace_id in config.catalog_trace_id:
         try:
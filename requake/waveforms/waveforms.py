@@ -9,15 +9,20 @@ Functions for downloading and processing waveforms.
     GNU General Public License v3.0 or later
     (https://www.gnu.org/licenses/gpl-3.0-standalone.html)
 """
+import os
 import contextlib
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from itertools import combinations
 import numpy as np
-from obspy import Stream, UTCDateTime
+from obspy import Stream, UTCDateTime, read
 from obspy.geodetics import gps2dist_azimuth, locations2degrees
 from obspy.taup import TauPyModel
 from obspy.signal.cross_correlation import correlate, xcorr_max
 from obspy.clients.fdsn.header import FDSNNoDataException
+from scipy.fft import next_fast_len, rfft, irfft
 from scipy.stats import median_abs_deviation
 from ..config import config, rq_exit
 from .station_metadata import get_traceid_coords, MetadataMismatchError
@@ -60,6 +65,25 @@ def _get_trace_id(ev):
     return min(distances, key=distances.get)
 
 
+def _trace_from_stream(st, traceid, starttime, endtime):
+    """
+    Trim and merge a downloaded stream and return its (demeaned) trace.
+
+    :raises NoWaveformError: if the stream is empty
+    """
+    # webservices sometimes return longer traces: trim to be sure
+    st.trim(starttime=starttime, endtime=endtime)
+    st.merge(fill_value='interpolate')
+    if not st:
+        raise NoWaveformError(
+            f'No waveform data for trace id: {traceid} '
+            f'between {starttime} and {endtime}'
+        )
+    tr = st[0]
+    tr.detrend(type='demean')
+    return tr
+
+
 def get_waveform(traceid, starttime, endtime):
     """Download waveform for a given traceid, start and end time."""
     client = config.dataselect_client
@@ -76,41 +100,105 @@ def get_waveform(traceid, starttime, endtime):
             f'between {starttime} and {endtime}\n'
             f'Error message: {msg}'
         ) from err
-    # webservices sometimes return longer traces: trim to be sure
-    st.trim(starttime=starttime, endtime=endtime)
-    st.merge(fill_value='interpolate')
-    if not st:
-        raise NoWaveformError(
-            f'No waveform data for trace id: {traceid} '
-            f'between {starttime} and {endtime}'
-        )
-    tr = st[0]
-    tr.detrend(type='demean')
+    return _trace_from_stream(st, traceid, starttime, endtime)
+
+
+def _waveform_cache_file(traceid, starttime, endtime):
+    """Return the cache file name for a given traceid, start and end time."""
+    time_fmt = '%Y%m%dT%H%M%S.%f'
+    fname = (
+        f'{traceid}_{starttime.strftime(time_fmt)}_'
+        f'{endtime.strftime(time_fmt)}.mseed'
+    )
+    return os.path.join(config.waveform_cache_dir, fname)
+
+
+def _use_waveform_cache():
+    """Return True if downloaded waveforms must be cached on disk."""
+    return config.waveform_cache and config.waveform_data_path is None
+
+
+def _read_waveform_cache(traceid, starttime, endtime):
+    """
+    Read a waveform from the disk cache.
+
+    :raises FileNotFoundError: if the waveform is not in the cache
+    """
+    cache_file = _waveform_cache_file(traceid, starttime, endtime)
+    return read(cache_file, format='MSEED')[0]
+
+
+def _write_waveform_cache(tr, traceid, starttime, endtime):
+    """Write a waveform to the disk cache."""
+    cache_file = _waveform_cache_file(traceid, starttime, endtime)
+    os.makedirs(config.waveform_cache_dir, exist_ok=True)
+    # write to a temporary file first, so that concurrent readers
+    # never see a partially written file. The temporary file name is unique
+    # across threads and processes
+    fd, tmp_file = tempfile.mkstemp(
+        suffix='.tmp', dir=config.waveform_cache_dir)
+    os.close(fd)
+    try:
+        tr.write(tmp_file, format='MSEED')
+        os.replace(tmp_file, cache_file)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_file)
+
+
+def get_cached_waveform(traceid, starttime, endtime):
+    """
+    Get waveform for a given traceid, start and end time, using a disk cache.
+
+    Downloaded waveforms are stored in miniSEED format in the waveform
+    cache directory and read from there on the following requests.
+    The cache is not used for local SDS archives or if the "waveform_cache"
+    config parameter is False.
+    """
+    if not _use_waveform_cache():
+        return get_waveform(traceid, starttime, endtime)
+    with contextlib.suppress(FileNotFoundError):
+        return _read_waveform_cache(traceid, starttime, endtime)
+    tr = get_waveform(traceid, starttime, endtime)
+    _write_waveform_cache(tr, traceid, starttime, endtime)
     return tr
 
 
-def get_event_waveform(ev):
-    """Download waveform for a given event at a given trace_id."""
+def _event_waveform_error(ev, traceid, err):
+    """Build the NoWaveformError raised when an event waveform is missing."""
+    msg = str(err).replace('\n', ' ')
+    return NoWaveformError(
+        f'Unable to download waveform data for event {ev.evid} '
+        f'and trace_id {traceid}. '
+        'Skipping event.\n'
+        f'Error message: {msg}'
+    )
+
+
+def _event_waveform_request(ev):
+    """
+    Compute the trace id and the time window of the waveform of an event.
+
+    :param ev: an event
+    :type ev: RequakeEvent
+    :return: trace id, start time, end time and trace stats for the event
+    :rtype: tuple of (str, UTCDateTime, UTCDateTime, dict)
+
+    :raises NoWaveformError: if station metadata or arrival times
+        are not available
+    """
     evid = ev.evid
     ev_lat = ev.lat
     ev_lon = ev.lon
     # avoid negative depths
     ev_depth = max(ev.depth, 0)
     orig_time = ev.orig_time
-    mag = ev.mag
-    mag_type = ev.mag_type
     traceid = ev.trace_id if config.args.traceid is None\
         else config.args.traceid
     try:
         traceid_coords = get_traceid_coords(orig_time)
     except MetadataMismatchError as err:
-        msg = str(err).replace('\n', ' ')
-        raise NoWaveformError(
-            f'Unable to download waveform data for event {evid} '
-            f'and trace_id {traceid}. '
-            'Skipping event.\n'
-            f'Error message: {msg}'
-        ) from err
+        raise _event_waveform_error(ev, traceid, err) from err
     trace_lat = traceid_coords[traceid]['latitude']
     trace_lon = traceid_coords[traceid]['longitude']
     try:
@@ -132,31 +220,106 @@ def get_event_waveform(ev):
     trace_length = config.cc_trace_length
     t0 = p_arrival_time - pre_p
     t1 = t0 + trace_length
+    stats = {
+        'evid': evid,
+        'ev_lat': ev_lat,
+        'ev_lon': ev_lon,
+        'ev_depth': ev_depth,
+        'orig_time': orig_time,
+        'mag': ev.mag,
+        'mag_type': ev.mag_type,
+        'coords': traceid_coords[traceid],
+        'dist_deg': dist_deg,
+        'distance': distance,
+        'P_arrival_time': p_arrival_time,
+        'S_arrival_time': s_arrival_time,
+    }
+    return traceid, t0, t1, stats
+
+
+def get_event_waveform(ev):
+    """Download waveform for a given event at a given trace_id."""
+    traceid, t0, t1, stats = _event_waveform_request(ev)
     try:
-        tr = get_waveform(traceid, t0, t1)
+        tr = get_cached_waveform(traceid, t0, t1)
     except NoWaveformError as err:
-        msg = str(err).replace('\n', ' ')
-        raise NoWaveformError(
-            f'Unable to download waveform data for event {evid} '
-            f'and trace_id {traceid}. '
-            'Skipping event.\n'
-            f'Error message: {msg}'
-        ) from err
-    tr.stats.evid = evid
-    tr.stats.ev_lat = ev_lat
-    tr.stats.ev_lon = ev_lon
-    tr.stats.ev_depth = ev_depth
-    tr.stats.orig_time = orig_time
-    tr.stats.mag = mag
-    tr.stats.mag_type = mag_type
-    tr.stats.coords = traceid_coords[traceid]
-    tr.stats.dist_deg = dist_deg
-    tr.stats.distance = distance
-    tr.stats.P_arrival_time = p_arrival_time
-    tr.stats.S_arrival_time = s_arrival_time
+        raise _event_waveform_error(ev, traceid, err) from err
+    tr.stats.update(stats)
     return tr
 
 
+def _get_waveforms_bulk(bulk):
+    """
+    Download waveforms for a list of requests, with a single bulk request.
+
+    :param bulk: list of (net, sta, loc, chan, starttime, endtime)
+    :type bulk: list of tuple
+    :return: downloaded waveforms
+    :rtype: obspy.Stream
+    """
+    try:
+        return config.dataselect_client.get_waveforms_bulk(bulk)
+    except FDSNNoDataException:
+        return Stream()
+
+
+def get_event_waveforms(events):
+    """
+    Download waveforms for a list of events.
+
+    Waveforms which are not in the disk cache are downloaded through
+    bulk requests (one request per download worker), instead of one request
+    per event.
+
+    :param events: list of events
+    :type events: list of RequakeEvent
+    :return: one (trace, error) tuple per event, in the same order as the
+        events; trace is None if an error occurred, error is None otherwise
+    :rtype: list of tuple of (obspy.Trace, NoWaveformError)
+    """
+    results = [None] * len(events)
+    requests = {}
+    for n, ev in enumerate(events):
+        try:
+            traceid, t0, t1, stats = _event_waveform_request(ev)
+        except NoWaveformError as err:
+            results[n] = (None, err)
+            continue
+        if _use_waveform_cache():
+            with contextlib.suppress(FileNotFoundError):
+                tr = _read_waveform_cache(traceid, t0, t1)
+                tr.stats.update(stats)
+                results[n] = (tr, None)
+                continue
+        requests[n] = (traceid, t0, t1, stats)
+    if not requests:
+        return results
+    bulk = [
+        (*traceid.split('.'), t0, t1)
+        for traceid, t0, t1, _stats in requests.values()
+    ]
+    nchunks = min(config.waveform_download_workers, len(bulk))
+    with ThreadPoolExecutor(max_workers=nchunks) as executor:
+        streams = executor.map(
+            _get_waveforms_bulk, [bulk[i::nchunks] for i in range(nchunks)])
+        st_all = Stream()
+        for st in streams:
+            st_all += st
+    for n, (traceid, t0, t1, stats) in requests.items():
+        # copy, since traces for overlapping time windows share their data
+        st = st_all.select(id=traceid).slice(t0, t1).copy()
+        try:
+            tr = _trace_from_stream(st, traceid, t0, t1)
+        except NoWaveformError as err:
+            results[n] = (None, _event_waveform_error(events[n], traceid, err))
+            continue
+        if _use_waveform_cache():
+            _write_waveform_cache(tr, traceid, t0, t1)
+        tr.stats.update(stats)
+        results[n] = (tr, None)
+    return results
+
+
 def process_waveforms(st):
     """Demean and filter a waveform trace or stream."""
     st = st.copy()
@@ -169,15 +332,27 @@ def process_waveforms(st):
     return st
 
 
-skipped_evids = []
-tr_cache = {}
+skipped_evids = set()
+# traces used by get_waveform_pair(), in least recently used order
+tr_cache = OrderedDict()
+tr_cache_maxsize = 10000
 old_cache_key = None
 
 
+def _cache_trace(cache_key, tr):
+    """Store a trace in the pair cache, evicting the least recently used."""
+    tr_cache[cache_key] = tr
+    if len(tr_cache) > tr_cache_maxsize:
+        tr_cache.popitem(last=False)
+
+
 def get_waveform_pair(pair):
     """
     Download traces for a given pair.
 
+    Traces are kept in memory, so that each event waveform is only
+    downloaded once when looping over all the event pairs.
+
     :param pair: pair of events
     :type pair: tuple of RequakeEvent
     :return: stream containing the two traces
@@ -190,25 +365,27 @@ def get_waveform_pair(pair):
     st = Stream()
     global old_cache_key
     cache_key = '_'.join((ev1.evid, ev1.trace_id))
-    # remove trace from cache when evid and/or trace_id changes
+    # pairs are built in catalog order: when the first event changes,
+    # the previous first event is not used anymore
     if old_cache_key is not None and cache_key != old_cache_key:
-        with contextlib.suppress(KeyError):
-            del tr_cache[cache_key]
+        tr_cache.pop(old_cache_key, None)
     old_cache_key = cache_key
     for ev in pair:
         if ev.evid in skipped_evids:
             raise NoWaveformError
-        # use cached trace, if possible
-        cache_key = '_'.join((ev.evid, ev.trace_id))
+    cache_keys = ['_'.join((ev.evid, ev.trace_id)) for ev in pair]
+    for key in cache_keys:
         with contextlib.suppress(KeyError):
-            st.append(tr_cache[cache_key])
-            continue
-        try:
-            tr = get_event_waveform(ev)
-            tr_cache[cache_key] = tr
-            st.append(tr)
-        except NoWaveformError as err:
-            skipped_evids.append(ev.evid)
+            tr_cache.move_to_end(key)
+    # download the traces not in cache, with a single request
+    missing = [
+        (ev, key) for ev, key in zip(pair, cache_keys) if key not in tr_cache
+    ]
+    missing_events = [ev for ev, _key in missing]
+    results = get_event_waveforms(missing_events) if missing_events else []
+    for (ev, key), (tr, err) in zip(missing, results):
+        if err is not None:
+            skipped_evids.add(ev.evid)
             msg = str(err).replace('\n', ' ')
             raise NoWaveformError(
                 f'Unable to download waveform data for event {ev.evid} '
@@ -216,11 +393,84 @@ def get_waveform_pair(pair):
                 'Skipping all pairs containig this event.\n'
                 f'Error message: {msg}'
             ) from err
+        _cache_trace(key, tr)
+    for key in cache_keys:
+        st.append(tr_cache[key])
     return st
 
 
+def prepare_template(template):
+    """
+    Prepare a template for repeated cross-correlations.
+
+    The template is processed once, and the spectra used for the
+    cross-correlation are kept in its stats, so that they are not recomputed
+    at each call to cc_waveform_pair().
+
+    :param template: template trace
+    :type template: obspy.Trace
+    :return: processed template
+    :rtype: obspy.Trace
+    """
+    template = process_waveforms(template)
+    template.stats.cc_spectra = {}
+    return template
+
+
+def _correlate_template(tr, template, shift):
+    """
+    Cross-correlate a processed trace with a template from
+    prepare_template().
+
+    Same result as obspy.signal.cross_correlation.correlate(), using the
+    cached template spectrum for the given FFT length.
+    """
+    # single precision is enough for the cross-correlation of waveforms,
+    # and makes the FFTs faster
+    data = (tr.data - np.mean(tr.data)).astype(np.float32)
+    template_data =\
+        (template.data - np.mean(template.data)).astype(np.float32)
+    npts = len(data)
+    npts_template = len(template_data)
+    npts_full = npts + npts_template - 1
+    nfft = next_fast_len(npts_full, real=True)
+    try:
+        template_spectrum = template.stats.cc_spectra[nfft]
+    except KeyError:
+        template_spectrum = np.conj(rfft(template_data, nfft))
+        template.stats.cc_spectra[nfft] = template_spectrum
+    cc_circ = irfft(rfft(data, nfft) * template_spectrum, nfft)
+    # full cross-correlation, from lag -(npts_template-1) to npts-1
+    cc_full = np.concatenate(
+        (cc_circ[nfft-npts_template+1:], cc_circ[:npts]))
+    # select lags as correlate() does
+    mid = npts_full // 2
+    if shift <= mid:
+        cc = cc_full[mid-shift:mid+shift+npts_full % 2]
+    else:
+        # correlate() zero-pads the trace for such a large shift
+        npad = (2 * shift - npts + npts_template) // 2
+        cc = np.zeros(npts + 2 * npad - npts_template + 1, dtype=cc_full.dtype)
+        start = npad - npts_template + 1
+        cc[start:start+npts_full] = cc_full
+    norm = (
+        np.sum(data**2, dtype=np.float64) *
+        np.sum(template_data**2, dtype=np.float64)
+    )**0.5
+    if norm <= np.finfo(float).eps:
+        cc[:] = 0
+    else:
+        cc /= norm
+    return cc
+
+
 def cc_waveform_pair(tr1, tr2, mode='events'):
-    """Perform cross-correlation."""
+    """
+    Perform cross-correlation.
+
+    If tr2 is a template from prepare_template(), it is not processed
+    again and its cached spectra are used.
+    """
     dt1 = tr1.stats.delta
     dt2 = tr2.stats.delta
     if dt1 != dt2:
@@ -237,9 +487,12 @@ def cc_waveform_pair(tr1, tr2, mode='events'):
                 'The two traces have a different sampling interval.')
             rq_exit(1)
     tr1 = process_waveforms(tr1)
-    tr2 = process_waveforms(tr2)
     shift = int(config.cc_max_shift/dt1)
-    cc = correlate(tr1, tr2, shift)
+    if 'cc_spectra' in tr2.stats:
+        cc = _correlate_template(tr1, tr2, shift)
+    else:
+        tr2 = process_waveforms(tr2)
+        cc = correlate(tr1, tr2, shift)
     abs_max = bool(config.cc_allow_negative)
     lag, cc_max = xcorr_max(cc, abs_max)
     lag_sec = lag*dt1
@@ -254,13 +507,16 @@ def align_pair(tr1, tr2):
     """Align tr2 respect to tr1 using cross-correlation."""
     lag, lag_sec, cc_max = cc_waveform_pair(tr1, tr2)
     # apply lag to trace #2
+    # (only the samples left empty by the shift are zeroed)
     # if lag is positive, trace #2 is delayed
     if lag > 0:
-        data2 = np.zeros_like(tr2.data)
+        data2 = np.empty_like(tr2.data)
+        data2[:lag] = 0
         data2[lag:] = tr2.data[:-lag]
     # if lag is negative, trace #2 is advanced
     elif lag < 0:
-        data2 = np.zeros_like(tr2.data)
+        data2 = np.empty_like(tr2.data)
+        data2[lag:] = 0
         data2[:lag] = tr2.data[-lag:]
     else:
         data2 = tr2.data